@@ -0,0 +1,62 @@
+import sys, os
+import time
+import tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from shellbot.window import Event
+from shellbot.store import MemoryStore
+
+class LegacyEvent:
+    # The Event layout before __slots__ and lazy parsing, for comparison.
+    def __init__(self, data):
+        if data.startswith('[[LOG]]'):
+            self.type = 'LOG'
+            self.misc, self.text = Event.parseLog(data)
+        elif data.startswith('[[SUC]]') or data.startswith('[[ERR]]'):
+            self.type = data[2:5]
+            self.misc = {}
+            self.text = data[7:]
+        else:
+            self.type = None
+            self.misc = None
+            self.text = data
+
+def lines(n):
+    for i in range(n):
+        if i % 10 == 0:
+            yield f"[[LOG]][ellipsis=True] epoch {i}"
+        elif i % 10 == 5:
+            yield f"[[SUC]] checkpoint {i}"
+        else:
+            yield f"step {i} loss={1 / (i + 1):.6f} lr=0.001"
+
+def legacy(n):
+    return [LegacyEvent(d) for d in lines(n)]
+
+def slotted(n):
+    return [Event(d) for d in lines(n)]
+
+def packed(n):
+    store = MemoryStore(Event)
+    for d in lines(n):
+        store.append(d)
+    return store
+
+def measure(build, n):
+    # The lines are produced inside the measurement, so whatever each
+    # layout keeps of them (raw line, stripped text, packed bytes) counts.
+    tracemalloc.start()
+    start = time.perf_counter()
+    events = build(n)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+    return size / n, n / elapsed
+
+def main(n=200000):
+    for build in [legacy, slotted, packed]:
+        per_line, rate = measure(build, n)
+        print(f"{build.__name__:12} {per_line:8.1f} bytes/line {rate:12.0f} lines/s")
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
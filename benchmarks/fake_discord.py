@@ -0,0 +1,121 @@
+import asyncio
+import collections
+import itertools
+import time
+
+class RateLimit:
+    def __init__(self, edits, per):
+        self.edits = edits
+        self.per = per
+        self.limited = 0
+        self._stamps = collections.deque()
+
+    async def hit(self):
+        now = time.monotonic()
+        while self._stamps and self._stamps[0] <= now - self.per:
+            self._stamps.popleft()
+        if len(self._stamps) >= self.edits:
+            # Like a 429 followed by the client's automatic retry.
+            self.limited += 1
+            await asyncio.sleep(self._stamps[0] + self.per - now)
+            self._stamps.popleft()
+        self._stamps.append(time.monotonic())
+
+class Transport:
+    def __init__(self, edits=5, per=5.0, latency=0.05):
+        self.latency = latency
+        self.channels = collections.defaultdict(lambda: RateLimit(edits, per))
+        self.responses = 0
+        self.edits = 0
+        self.reactions = 0
+        self.deleted = 0
+        self._ids = itertools.count(1000)
+
+    @property
+    def limited(self):
+        return sum(c.limited for c in self.channels.values())
+
+    async def call(self, channel_id=None):
+        if channel_id is not None:
+            await self.channels[channel_id].hit()
+        await asyncio.sleep(self.latency)
+
+    def next_id(self):
+        return next(self._ids)
+
+class User:
+    def __init__(self, id, roles=()):
+        self.id = id
+        self.roles = list(roles)
+
+    def __eq__(self, other):
+        return isinstance(other, User) and other.id == self.id
+
+    def __hash__(self):
+        return self.id
+
+class Emoji:
+    def __init__(self, name):
+        self.name = name
+
+class Message:
+    def __init__(self, transport, channel_id, author, content):
+        self.id = transport.next_id()
+        self.channel_id = channel_id
+        self.author = author
+        self.content = content
+        self.interaction = None
+        self._transport = transport
+
+    async def add_reaction(self, emoji):
+        self._transport.reactions += 1
+        await self._transport.call()
+
+    async def remove_reaction(self, emoji, member):
+        self._transport.reactions += 1
+        await self._transport.call()
+
+    async def delete(self):
+        self._transport.deleted += 1
+        await self._transport.call()
+
+class Interaction:
+    def __init__(self, transport, message):
+        self._transport = transport
+        self._message = message
+
+    async def original_response(self):
+        return self._message
+
+    async def edit_original_response(self, content=None):
+        await self._transport.call(self._message.channel_id)
+        self._transport.edits += 1
+        self._message.content = content
+
+class Context:
+    def __init__(self, transport, bot_user, author, channel_id):
+        self._transport = transport
+        self._bot_user = bot_user
+        self.author = author
+        self.channel_id = channel_id
+        self.guild = None
+        self.interaction = type('Interaction', (), {'user': author})()
+        self.messages = []
+
+    async def defer(self, ephemeral=False):
+        await self._transport.call()
+
+    async def respond(self, content=None, ephemeral=False, file=None, files=None):
+        await self._transport.call()
+        self._transport.responses += 1
+        message = Message(self._transport, self.channel_id, self._bot_user, content)
+        self.messages.append(message)
+        return Interaction(self._transport, message)
+
+class Payload:
+    def __init__(self, member, emoji, message_id, channel_id):
+        self.member = member
+        self.user_id = member.id
+        self.emoji = Emoji(emoji)
+        self.message_id = message_id
+        self.channel_id = channel_id
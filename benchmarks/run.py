@@ -0,0 +1,177 @@
+import os, sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import subprocess
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+from fake_discord import Transport, Context, User, Payload
+from shellbot import Shellbot
+from shellbot.stats import stats
+
+BOT = User(1)
+USER = User(2)
+
+def printer(lines, width=40, pause=0.0):
+    code = ("import sys, time\n"
+            f"for i in range({lines}):\n"
+            f"    sys.stdout.write(str(i).rjust({width}) + '\\n')\n"
+            f"    if {pause} and i % 100 == 99: sys.stdout.flush(); time.sleep({pause})\n")
+    return [sys.executable, '-c', code]
+
+def make_bot(history, **kwargs):
+    bot = Shellbot(users=[USER.id], history_dir=history, sample_interval=None,
+                   stats_enabled=True, **kwargs)
+    bot._connection.user = BOT
+    return bot
+
+async def settle(bot):
+    renderer = bot._renderer
+    while renderer._dirty or renderer.stats()['pending']:
+        await asyncio.sleep(0.05)
+
+async def run_jobs(bot, transport, commands, views=1, channels=1):
+    jobs = [bot.create_job(args) for args in commands]
+    tasks = []
+    for i, job in enumerate(jobs):
+        ctx = Context(transport, BOT, USER, i % channels)
+        tasks.append(asyncio.create_task(bot.run_job(ctx, job)))
+        for v in range(1, views):
+            await job.view(Context(transport, BOT, USER, (i + v) % channels))
+
+    start = time.monotonic()
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - start
+    await settle(bot)
+    return jobs, elapsed
+
+async def one_job(history, transport, scale):
+    lines = int(1000000 * scale)
+    bot = make_bot(history, max_lines_per_second=None, max_bytes_per_second=None)
+    jobs, elapsed = await run_jobs(bot, transport, [printer(lines)])
+    return bot, jobs, elapsed
+
+async def many_jobs(history, transport, scale):
+    count = max(1, int(100 * scale))
+    bot = make_bot(history)
+    jobs, elapsed = await run_jobs(bot, transport,
+                                   [printer(10000, pause=0.01) for _ in range(count)],
+                                   channels=10)
+    return bot, jobs, elapsed
+
+async def many_views(history, transport, scale):
+    views = max(1, int(50 * scale))
+    bot = make_bot(history)
+    jobs, elapsed = await run_jobs(bot, transport, [printer(20000, pause=0.01)],
+                                   views=views, channels=views)
+    return bot, jobs, elapsed
+
+async def reaction_storm(history, transport, scale):
+    count = int(20000 * scale)
+    bot = make_bot(history)
+    job = bot.create_job(printer(100000, pause=0.005))
+    contexts = [Context(transport, BOT, USER, i) for i in range(20)]
+    task = asyncio.create_task(bot.run_job(contexts[0], job))
+    await asyncio.sleep(0.2)
+    for ctx in contexts[1:]:
+        await job.view(ctx)
+    messages = [ctx.messages[0] for ctx in contexts]
+
+    rng = random.Random(0)
+    start = time.monotonic()
+    try:
+        for i in range(count):
+            roll = rng.random()
+            if roll < 0.8:
+                payload = Payload(USER, rng.choice(['👍', '🎉', '🔥']), rng.choice(messages).id, 0)
+            elif roll < 0.95:
+                payload = Payload(USER, '💀', 10 ** 9 + i, 0)
+            elif not task.done() and job.views:
+                # A finished job may be evicted, and unknown messages would be fetched from the API.
+                message = rng.choice(job.views).message
+                payload = Payload(USER, '🗑️', message.id, message.channel_id)
+            else:
+                continue
+            await bot.on_raw_reaction_add(payload)
+        elapsed = time.monotonic() - start
+    finally:
+        await bot.kill_job(job)
+        await task
+    await settle(bot)
+    return bot, [job], elapsed
+
+# Each scenario with what its elapsed time measures: ingesting output or
+# handling reactions.
+SCENARIOS = {'one_job': (one_job, 'lines'),
+             'many_jobs': (many_jobs, 'lines'),
+             'many_views': (many_views, 'lines'),
+             'reaction_storm': (reaction_storm, 'reactions')}
+
+async def child(name, scale, rate, per, latency):
+    transport = Transport(edits=rate, per=per, latency=latency)
+    with tempfile.TemporaryDirectory(prefix='shellbot_bench_') as history:
+        scenario, unit = SCENARIOS[name]
+        bot, jobs, elapsed = await scenario(history, transport, scale)
+        renderer = bot._renderer.stats()
+        await bot.close()
+
+    lines = sum(job.lines_in for job in jobs)
+    reactions = stats.timers['reaction_seconds']
+    return {'scenario': name,
+            'seconds': elapsed,
+            'lines': lines,
+            'lines_per_second': lines / elapsed if elapsed and unit == 'lines' else None,
+            'reactions_per_second': reactions.count / elapsed if elapsed and unit == 'reactions' else None,
+            'edits': transport.edits,
+            'edits_skipped': renderer['skipped'],
+            'rate_limited': transport.limited,
+            'render_p50': renderer['latency_p50'],
+            'render_p90': renderer['latency_p90'],
+            'render_p99': renderer['latency_p99'],
+            'reaction_p99': reactions.percentile(0.99) if reactions.count else None,
+            'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+def fmt(value):
+    if value is None: return '-'
+    if isinstance(value, float): return f"{value:.4g}"
+    return str(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline shellbot benchmarks.")
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS))
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--rate', type=int, default=5, help="simulated edits allowed per channel")
+    parser.add_argument('--per', type=float, default=5.0, help="simulated rate limit window in seconds")
+    parser.add_argument('--latency', type=float, default=0.05, help="simulated request latency in seconds")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    if args.child:
+        result = asyncio.run(child(args.scenarios[0], args.scale, args.rate, args.per, args.latency))
+        print(json.dumps(result))
+        return
+
+    results = []
+    for name in args.scenarios:
+        # One process per scenario so peak RSS is not shared between them.
+        out = subprocess.run([sys.executable, __file__, name, '--child',
+                              '--scale', str(args.scale), '--rate', str(args.rate),
+                              '--per', str(args.per), '--latency', str(args.latency)],
+                             check=True, stdout=subprocess.PIPE, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = list(results[0])
+    print('  '.join(c.rjust(14) for c in columns))
+    for result in results:
+        print('  '.join(fmt(result[c]).rjust(14) for c in columns))
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,9 @@
-from shellbot.shellbot import Shellbot
-from shellbot.logging import log, error, success
+from shellbot.logging import log, error, success, progress, metric
 
+def __getattr__(name):
+    # Imported on first use, so that jobs using the logging helpers and
+    # python -m shellbot.worker do not need py-cord.
+    if name == 'Shellbot':
+        from shellbot.shellbot import Shellbot
+        return Shellbot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,36 +1,74 @@
 import shellbot
+import os
 import sys
 import json
-import watchdog.events, watchdog.observers
-
-
-shellbot.Shellbot()
+import argparse
+import functools
 
 def config(path):
-    kwargs = json.load(open(path))
+    with open(path) as f:
+        kwargs = json.load(f)
     token = kwargs['token']
     del kwargs['token']
     return kwargs, token
 
-def main(argv):
-    config_path = argv[1]
-    kwargs, token = config(config_path)
+def reload(bot, kwargs):
+    try:
+        bot.set(**kwargs)
+    except ValueError as e:
+        print(f"Keeping the previous configuration: {e}", file=sys.stderr)
+        return
+    print("Reloaded changes.")
 
-    bot = shellbot.Shellbot(**kwargs)
-    observer = watchdog.observers.Observer()
+def watch(bot, path):
+    # Only imported when watching, so watchdog stays optional.
+    import watchdog.events, watchdog.observers
+
+    path = os.path.abspath(path)
 
     class Handler(watchdog.events.FileSystemEventHandler):
-        def on_modified(self, event):
-            print("Reloading changes...")
-            kwargs, _ = config(config_path)
-            bot.set(**kwargs)
+        def __init__(self):
+            self._last = None
 
-    handler = Handler()
-    observer.schedule(handler, config_path)
+        def on_any_event(self, event):
+            # Editors often replace the file instead of writing it in place,
+            # so the directory is watched and moves onto the path count too.
+            if event.event_type not in ['modified', 'created', 'moved']: return
+            paths = [event.src_path, getattr(event, 'dest_path', None)]
+            if path not in [os.path.abspath(p) for p in paths if p]: return
+            try:
+                kwargs, _ = config(path)
+            except (OSError, ValueError, KeyError) as e:
+                # Possibly caught halfway through a write; the next event retries.
+                print(f"Not reloading {path}: {e!r}", file=sys.stderr)
+                return
+            if kwargs == self._last: return
+            self._last = kwargs
+            # set() runs on the bot's event loop, never concurrently with a command.
+            bot.loop.call_soon_threadsafe(functools.partial(reload, bot, kwargs))
 
-    #observer.start()
-    bot.run(token)
-    #observer.join()
+    observer = watchdog.observers.Observer()
+    observer.daemon = True
+    observer.schedule(Handler(), os.path.dirname(path))
+    observer.start()
+    return observer
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m shellbot')
+    parser.add_argument('config', help="path to the JSON configuration")
+    parser.add_argument('--watch', action='store_true',
+                        help="reload users and roles when the configuration changes (needs watchdog)")
+    args = parser.parse_args(argv[1:])
+    kwargs, token = config(args.config)
+
+    bot = shellbot.Shellbot(**kwargs)
+    observer = watch(bot, args.config) if args.watch else None
+    try:
+        bot.run(token)
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
 
 if __name__ == '__main__':
     main(sys.argv)
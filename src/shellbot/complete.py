@@ -1,35 +1,83 @@
+import os
+import json
+import collections
 import discord
 
+MAX_CHOICES = 25 # Discord's limit on autocomplete choices
+
 class Complete:
-    def __init__(self, bot, all_options=None, max_history=100):
+    def __init__(self, bot, all_options=None, max_history=100, path=None):
         self._bot = bot
         self._all_options = all_options
         self._history = {}
-        self._max_history = 100
+        self._counts = collections.Counter()
+        self._max_history = max_history
+        self._path = path
+        if path is not None:
+            self._load()
 
-    def update_history(self, ctx, item):
-        if ctx.author.id not in self._history:
-            self._history[ctx.author.id] = []
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        for user, items in data.get('history', {}).items():
+            self._history[int(user)] = collections.OrderedDict.fromkeys(items[-self._max_history:])
+        self._counts.update(dict(data.get('counts', [])))
+
+    def _save(self):
+        data = {'history': {user: list(history) for user, history in self._history.items()},
+                'counts': list(self._counts.items())}
+        temp = self._path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp, self._path)
 
-        history = self._history[ctx.author.id]
-        history.append(item)
+    def update_history(self, ctx, item):
+        history = self._history.setdefault(ctx.author.id, collections.OrderedDict())
+        history[item] = None
+        history.move_to_end(item)
         if len(history) > self._max_history:
-            history.pop(0)
+            history.popitem(last=False)
 
-    @property
-    def autocomplete(self):
-        def complete_inner(ctx: discord.AutocompleteContext):
-            if not self._bot.permitted(ctx.interaction.user): return []
+        self._counts[item] += 1
+        # Keep the global counts bounded too, dropping the least used items.
+        if len(self._counts) > 2 * self._max_history * max(len(self._history), 1):
+            self._counts = collections.Counter(dict(self._counts.most_common(len(self._counts) // 2)))
+
+        if self._path is not None:
+            self._save()
+
+    @staticmethod
+    def _match(text, query):
+        if not query: return 0
+        if text.startswith(query): return 0
+        if any(token.startswith(query) for token in text.split()): return 1
+        if query in text: return 2
+        return None
 
-            history = self._history.get(ctx.interaction.user.id, [])
-            if self._all_options is None:
-                return history[::-1]
+    def options(self, user_id, query=''):
+        history = self._history.get(user_id, {})
+        recency = {item: i for i, item in enumerate(reversed(history))}
+        if self._all_options is None:
+            candidates = list(recency)
+            candidates += [item for item, _ in self._counts.most_common() if item not in recency]
+        else:
+            candidates = self._all_options()
 
-            def how_recent(item):
-                if item in history:
-                    return -history.index(item)
-                return 1
+        query = query.lower()
+        ranked = []
+        for i, item in enumerate(candidates):
+            match = Complete._match(str(item).lower(), query)
+            if match is None: continue
+            ranked.append((match, recency.get(item, len(recency)), -self._counts[item], i, item))
+        ranked.sort(key=lambda entry: entry[:4])
+        return [entry[-1] for entry in ranked[:MAX_CHOICES]]
 
-            buff = self._all_options()
-            return list(sorted(buff, key=how_recent))
-        return discord.utils.basic_autocomplete(complete_inner)
+    @property
+    def autocomplete(self):
+        async def complete_inner(ctx: discord.AutocompleteContext):
+            if not self._bot.permitted(ctx.interaction.user): return []
+            return self.options(ctx.interaction.user.id, str(ctx.value or ''))
+        return complete_inner
@@ -1,24 +1,132 @@
-import subprocess, threading
-import importlib.util
-import io, sys, time
+import os
 import asyncio
+import collections
+import functools
+import time
 from shellbot.window import Window
+from shellbot.render import Renderer
+from shellbot.usage import Usage
+from shellbot.supervisor import Supervised
+from shellbot import terminal
+from shellbot.stats import stats
+
+STATUS_PREFIXES = {'queued': '*',
+                   'running': '>',
+                   'success': '+',
+                   'fail': '-'}
+
+class Flood:
+    def __init__(self, lines=None, bytes=None, interval=1.0):
+        self._lines = lines
+        self._bytes = bytes
+        self._line_tokens = lines or 0
+        self._byte_tokens = bytes or 0
+        self._stamp = time.monotonic()
+        self._interval = interval
+        self._reported = self._stamp
+        self.suppressed = 0
+        self.total = 0
+
+    def admit(self, size):
+        if self._lines is None and self._bytes is None: return True
+        now = time.monotonic()
+        elapsed = now - self._stamp
+        self._stamp = now
+
+        # Once lines are being dropped, keep dropping them until the next
+        # report so the window gets one marker per interval, not one per gap.
+        ok = not self.suppressed or now - self._reported >= self._interval
+        if self._lines is not None:
+            self._line_tokens = min(self._lines, self._line_tokens + elapsed * self._lines)
+            ok = ok and self._line_tokens >= 1
+        if self._bytes is not None:
+            size = min(size, self._bytes)
+            self._byte_tokens = min(self._bytes, self._byte_tokens + elapsed * self._bytes)
+            ok = ok and self._byte_tokens >= size
+
+        if not ok:
+            if not self.suppressed:
+                self._reported = now
+            self.suppressed += 1
+            self.total += 1
+            return False
+        if self._lines is not None: self._line_tokens -= 1
+        if self._bytes is not None: self._byte_tokens -= size
+        return True
+
+    def report(self, force=False, keep=0):
+        # keep: lines of the current burst that are shown after all.
+        if not self.suppressed: return None
+        now = time.monotonic()
+        if not force and now - self._reported < self._interval: return None
+        self._reported = now
+        count, self.suppressed = self.suppressed - keep, 0
+        self.total -= keep
+        if count <= 0: return None
+        return f"... {count} lines suppressed ..."
 
 class Job:
     id_counter = 0
+    CHUNK_SIZE = 1 << 16
+    KEEP_SUPPRESSED = 20
+    MAX_LINE = 1 << 16
+    KILL_TIMEOUT = 3
 
-    def __init__(self, args):
+    def __init__(self, args, store=None, renderer=None, registry=None,
+                 log=None, max_lines=None, max_bytes=None, sample_interval=None,
+                 journal=None, id=None, state=None, index=False, runner=None, host=None):
         self.args = args
-        self.id = Job.id_counter
-        Job.id_counter += 1
-        self._relay = None
-        self._queue = []
-        self._window = Window(self.id)
+        self.host = host
+        if id is None:
+            id = Job.id_counter
+            Job.id_counter += 1
+        self.id = id
+        self._journal = journal
+        self._window = Window(self.id,
+                              store(self.id) if store else None,
+                              Renderer() if renderer is None else renderer,
+                              functools.partial(registry.track, self) if registry is not None else None,
+                              index)
         self._ps = None
-        self.status = None
+        self._log_path = log(self.id) if log else None
+        self._log = None
+        self._state_path = state(self.id) if state else None
+        self._runner = runner
+        self._replay = 0
+        self._killed = False
+        self._flood = Flood(max_lines, max_bytes)
+        # The last suppressed lines, shown at the end: usually the result.
+        self._suppressed = collections.deque(maxlen=Job.KEEP_SUPPRESSED)
+        self._sample_interval = sample_interval
+        self.usage = None
+        self.lines_in = 0
+        self.bytes_in = 0
+        self.returncode = None
+        self._status = None
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, status):
+        if status == self._status: return
+        self._status = status
+        if self._journal is not None:
+            if self.returncode is None:
+                self._journal.record(self.id, status=status)
+            else:
+                self._journal.record(self.id, status=status, returncode=self.returncode)
 
-    def has_view(self, message):
-        return self._window.has_view(message)
+    def restore(self, status, returncode=None):
+        # A job from the journal: its output is on disk and nothing is running.
+        self._status = status
+        self.returncode = returncode
+        self._window.close(exit_status=returncode)
+
+    @property
+    def views(self):
+        return self._window.views
 
     async def view(self, ctx):
         await self._window.view(ctx)
@@ -26,40 +134,191 @@ class Job:
     async def close_view(self, message):
         await self._window.close_view(message)
 
+    def last(self):
+        return self._window.last()
+
+    def scroll(self, view, action):
+        self._window.scroll(view, action)
+
+    async def search(self, regex, pattern=None, context=0):
+        search = self._window.search(regex, pattern, context)
+        with stats.timer('search_seconds'):
+            return await asyncio.get_running_loop().run_in_executor(None, search)
+
+    def output(self):
+        if self._log is not None:
+            self._log.flush()
+        return self._log_path
+
+    def _close_log(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _report(self, force=False):
+        report = self._flood.report(force)
+        if report is not None:
+            self._suppressed.clear()
+            self._window.update(report)
+
+    def _report_last(self):
+        tail = list(self._suppressed)
+        self._suppressed.clear()
+        report = self._flood.report(force=True, keep=len(tail))
+        if report is not None:
+            self._window.update(report)
+        for line in tail:
+            self._window.update(terminal.collapse(line.decode('utf-8', 'replace')))
+
+    def dump(self):
+        chunks = self._window.dump()
+        yield next(chunks)
+        if self._flood.total:
+            yield (f"--- {self._flood.total} lines were suppressed in this view; "
+                   f"/job dump with full has the complete output\n\n")
+        yield from chunks
+
+    def _ingest(self, line):
+        # Series samples update a line in place, so they are not rate limited.
+        if line.startswith(b'[[') and self._window.sample(line.decode('utf-8', 'replace')):
+            return
+        # Output that was already shown before a restart is not rate limited.
+        if self.bytes_in <= self._replay or self._flood.admit(len(line)):
+            self._report(force=True)
+            self._window.update(terminal.collapse(line.decode('utf-8', 'replace')))
+        else:
+            self._suppressed.append(bytes(line))
+            self._report()
+
+    async def _sample(self):
+        while True:
+            self.usage.sample()
+            self._window.set_status(self.usage.summary(elapsed=False))
+            await asyncio.sleep(self._sample_interval)
+
+    async def _read(self, ps):
+        buff = bytearray()
+        while True:
+            data = await ps.stdout.read(Job.CHUNK_SIZE)
+            if not data: break
+            if self._log is not None:
+                self._log.write(data)
+            lines = data.count(b'\n')
+            self.lines_in += lines
+            self.bytes_in += len(data)
+            stats.count('relay_lines', lines)
+            stats.count('relay_bytes', len(data))
+
+            end = data.rfind(b'\n')
+            if end < 0:
+                buff += data
+            else:
+                buff += data[:end]
+                for line in buff.split(b'\n'):
+                    self._ingest(line)
+                buff[:] = data[end + 1:]
+
+            if b'\r' in buff:
+                # The current line is being redrawn in place, e.g. a progress
+                # bar: show it as it is now, without storing every redraw.
+                buff[:] = terminal.compact(buff)
+                self._window.partial(terminal.collapse(buff.decode('utf-8', 'replace')))
+            elif len(buff) >= Job.MAX_LINE:
+                self._ingest(buff)
+                buff.clear()
+
+            if end >= 0:
+                # Reading never suspends while the pipe has data, so yield to
+                # let other jobs and the renderer run between chunks.
+                await asyncio.sleep(0)
+
+        if buff:
+            self._ingest(buff)
+        self._report_last()
+
+    async def _spawn(self):
+        if self._runner is not None:
+            # Runs elsewhere; the output is streamed back like a local pipe.
+            if self._log_path is not None:
+                self._log = open(self._log_path, 'ab')
+            return await self._runner(self.args)
+        if self._state_path is not None and self._log_path is not None:
+            # Detached: the job outlives the bot and its output is tailed from the log.
+            return await Supervised.start(self.args, self._log_path, self._state_path)
+        if self._log_path is not None:
+            self._log = open(self._log_path, 'ab')
+        return await asyncio.create_subprocess_exec(*self.args,
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.STDOUT)
+
+    async def _run(self, ps=None):
+        try:
+            if ps is None:
+                ps = await self._spawn()
+            self._ps = ps
+            if self._killed:
+                # Killed while it was being started.
+                ps.terminate()
+        except Exception as e:
+            self._close_log()
+            self._window.update(str(e))
+            self._window.close()
+            self.status = 'fail'
+            return
+
+        sampler = None
+        if self._sample_interval is not None and ps.pid is not None:
+            self.usage = Usage(ps.pid)
+            sampler = asyncio.create_task(self._sample())
+
+        done = False
+        try:
+            await self._read(ps)
+            done = True
+        finally:
+            self._close_log()
+            if sampler is not None:
+                sampler.cancel()
+            # A detached job keeps running when the bot stops tailing it.
+            if done or not isinstance(ps, Supervised):
+                await self._finish(ps)
+
+    async def _finish(self, ps):
+        if self.usage is not None:
+            self.usage.sample()
+        await ps.wait()
+        if self.usage is not None:
+            self.usage.finish()
+            self._window.set_status(self.usage.summary())
+        self._window.close(exit_status=ps.returncode)
+        self.returncode = ps.returncode
+        self.status = 'success' if ps.returncode == 0 else 'fail'
+
     async def start(self):
         self.status = 'running'
+        await self._run()
+
+    async def reattach(self):
+        # Rebuild the window from the complete output, then keep tailing it.
+        self._status = 'running'
+        self._replay = os.path.getsize(self._log_path) if os.path.exists(self._log_path) else 0
+        await self._run(Supervised(self._log_path, self._state_path))
 
-        def relay():
-            try:
-                ps = subprocess.Popen(args=self.args,
-                                      stdout=subprocess.PIPE,
-                                      stderr=subprocess.STDOUT)
-                self._ps = ps
-            except Exception as e:
-                self._window.update(str(e))
-                self._window.close()
-                self.status = 'fail'
-                return
-
-            while True:
-                data = ps.stdout.readline()
-                if not data: break
-                self._window.update(data.decode('utf-8')[:-1])
-
-            self._ps.wait()
-            self._window.close(exit_status=self._ps.poll())
-            self.status = 'success' if self._ps.poll() == 0 else 'fail'
-
-        await self._window.render()
-        self._relay = threading.Thread(target=relay)
-        self._relay.start()
-        while await self._window.render():
-            await asyncio.sleep(0.1)
+    def cancel(self, reason="Cancelled before it started."):
+        self._window.update(reason)
+        self._window.close()
+        self.status = 'fail'
 
     async def kill(self):
-        assert self._ps is not None
-        self._ps.terminate()
-        if self._ps.poll() is None:
-            await asyncio.sleep(3)
-            if self._ps.poll() is None:
-                self._ps.kill()
+        if self._ps is None:
+            self._killed = self.status == 'running'
+            return
+        if self._ps.returncode is not None: return
+        try:
+            self._ps.terminate()
+            await asyncio.wait_for(self._ps.wait(), Job.KILL_TIMEOUT)
+        except ProcessLookupError:
+            pass
+        except asyncio.TimeoutError:
+            self._ps.kill()
+            await self._ps.wait()
@@ -0,0 +1,65 @@
+import os
+import json
+import time
+
+class Journal:
+    def __init__(self, path):
+        self._path = path
+        self._jobs = None
+        self._file = None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def jobs(self):
+        if self._jobs is None:
+            self._jobs = self._load()
+        return self._jobs
+
+    def _load(self):
+        jobs = {}
+        try:
+            with open(self._path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A write torn by a crash; the rest of the journal is intact.
+                        continue
+                    jobs.setdefault(record.pop('id'), {}).update(record)
+        except FileNotFoundError:
+            pass
+        return jobs
+
+    def next_id(self):
+        return max(self.jobs, default=-1) + 1
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+        self._file = open(self._path, 'ab')
+        if self._file.tell() > 0:
+            with open(self._path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write(b'\n')
+
+    def record(self, id, **fields):
+        if self._file is None:
+            self._open()
+        self._file.write((json.dumps({'id': id, **fields}) + '\n').encode('utf-8'))
+        self._file.flush()
+        if self._jobs is not None:
+            self._jobs.setdefault(id, {}).update(fields)
+
+    def create(self, id, args, host=None):
+        if host is None:
+            self.record(id, args=args, created=time.time())
+        else:
+            self.record(id, args=args, created=time.time(), host=host)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,3 +1,5 @@
+import time
+
 def log(*args):
     if not args:
         print("[[LOG]]", flush=True)
@@ -23,3 +25,10 @@ def success(*args):
 
     txt = ' '.join(map(str, args))
     print(f"[[SUC]] {txt}", flush=True)
+
+def progress(name, done, total=None):
+    total = '-' if total is None else total
+    print(f"[[PRG]] {time.time():.3f} {done} {total} {name}", flush=True)
+
+def metric(name, value):
+    print(f"[[MET]] {time.time():.3f} {value} {name}", flush=True)
@@ -0,0 +1,44 @@
+import json
+import struct
+
+# Frames between the bot and a worker: payload length, frame type, payload.
+# Control frames carry JSON; output frames carry the job ID and raw bytes.
+HEADER = struct.Struct('!IB')
+JOB_ID = struct.Struct('!I')
+MAX_FRAME = 1 << 24
+
+HELLO = ord('H')   # both ways: token / worker capacity
+RUN = ord('R')     # bot: id, args
+SIGNAL = ord('G')  # bot: id, signal name
+STARTED = ord('S') # worker: id, pid
+OUTPUT = ord('O')  # worker: id + raw output
+EXIT = ord('X')    # worker: id, returncode
+ERROR = ord('E')   # worker: id, error
+LOAD = ord('L')    # worker: running jobs
+
+class ProtocolError(Exception):
+    pass
+
+async def read(reader):
+    length, kind = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_FRAME:
+        raise ProtocolError(f"Frame of {length} bytes exceeds the limit.")
+    return kind, await reader.readexactly(length)
+
+def write(writer, kind, payload=b''):
+    writer.write(HEADER.pack(len(payload), kind) + payload)
+
+def send(writer, kind, **fields):
+    write(writer, kind, json.dumps(fields).encode('utf-8'))
+
+def output(writer, id, data):
+    write(writer, OUTPUT, JOB_ID.pack(id) + data)
+
+def load(payload):
+    try:
+        return json.loads(payload)
+    except ValueError:
+        raise ProtocolError("Malformed frame.")
+
+def split_output(payload):
+    return JOB_ID.unpack_from(payload)[0], payload[JOB_ID.size:]
@@ -0,0 +1,58 @@
+import time
+from typing import Optional
+
+class Registry:
+    def __init__(self,
+                 max_finished: Optional[int] = None,
+                 max_age: Optional[float] = None,
+                 ):
+        self.max_finished = max_finished
+        self.max_age = max_age
+        self._jobs = {}
+        self._views = {}
+        self._finished = {}
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __iter__(self):
+        return iter(list(self._jobs.values()))
+
+    def add(self, job):
+        self._jobs[job.id] = job
+        self.evict()
+
+    def get(self, id):
+        return self._jobs.get(id)
+
+    def by_message(self, message_id):
+        return self._views.get(message_id, (None, None))
+
+    def track(self, job, view, opened):
+        if opened:
+            if job.id in self._jobs:
+                self._views[view.message_id] = (job, view)
+        else:
+            self._views.pop(view.message_id, None)
+
+    def finish(self, job):
+        if job.id in self._jobs:
+            self._finished[job.id] = time.monotonic()
+        self.evict()
+
+    def evict(self):
+        # Finish times are monotonic, so expired jobs form a prefix.
+        drop = 0
+        if self.max_age is not None:
+            deadline = time.monotonic() - self.max_age
+            for t in self._finished.values():
+                if t >= deadline: break
+                drop += 1
+        if self.max_finished is not None:
+            drop = max(drop, len(self._finished) - self.max_finished)
+
+        for id in list(self._finished)[:drop]:
+            del self._finished[id]
+            job = self._jobs.pop(id)
+            for view in job.views:
+                self._views.pop(view.message_id, None)
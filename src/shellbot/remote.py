@@ -0,0 +1,170 @@
+import asyncio
+import itertools
+from shellbot import protocol
+
+class Output:
+    # The stdout of a RemoteProcess. While a job has LIMIT bytes buffered
+    # the connection is not read, so the worker's drain() blocks the job
+    # instead of the bot buffering its output without limit.
+    LIMIT = 1 << 20
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._eof = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    def feed_data(self, data):
+        self._buffer += data
+        self._readable.set()
+        if len(self._buffer) >= Output.LIMIT:
+            self._writable.clear()
+
+    def feed_eof(self):
+        self._eof = True
+        self._readable.set()
+        self._writable.set()
+
+    async def read(self, n):
+        while not self._buffer and not self._eof:
+            self._readable.clear()
+            await self._readable.wait()
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        if len(self._buffer) < Output.LIMIT:
+            self._writable.set()
+        return data
+
+    async def drain(self):
+        await self._writable.wait()
+
+class RemoteProcess:
+    # The part of asyncio.subprocess.Process that Job uses, for a job
+    # running on a worker.
+    def __init__(self, worker, id):
+        self._worker = worker
+        self._id = id
+        self._started = asyncio.get_running_loop().create_future()
+        self._exited = asyncio.get_running_loop().create_future()
+        self.stdout = Output()
+        self.pid = None # not local, so it is not sampled from /proc
+        self.returncode = None
+
+    def _exit(self, returncode):
+        if self._exited.done(): return
+        self.returncode = returncode
+        self.stdout.feed_eof()
+        self._exited.set_result(returncode)
+
+    async def wait(self):
+        return await asyncio.shield(self._exited)
+
+    def send_signal(self, name):
+        if self.returncode is not None or not self._worker.connected:
+            raise ProcessLookupError()
+        protocol.send(self._worker._writer, protocol.SIGNAL, id=self._id, signal=name)
+
+    def terminate(self):
+        self.send_signal('SIGTERM')
+
+    def kill(self):
+        self.send_signal('SIGKILL')
+
+class Worker:
+    CONNECT_TIMEOUT = 10
+
+    def __init__(self, name, address, token=None):
+        self.name = name
+        self.address = address
+        self._token = token
+        self._reader = None
+        self._writer = None
+        self._task = None
+        self._lock = asyncio.Lock()
+        self._procs = {}
+        self._ids = itertools.count()
+        self.cpus = 1
+        self.running = 0
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    @property
+    def load(self):
+        return self.running / self.cpus
+
+    async def _open(self):
+        if self.address.startswith('unix:'):
+            return await asyncio.open_unix_connection(self.address[5:])
+        host, _, port = self.address.rpartition(':')
+        return await asyncio.open_connection(host.strip('[]'), int(port))
+
+    async def connect(self):
+        async with self._lock:
+            if self.connected: return
+            reader, writer = await asyncio.wait_for(self._open(), Worker.CONNECT_TIMEOUT)
+            try:
+                protocol.send(writer, protocol.HELLO, token=self._token)
+                kind, payload = await asyncio.wait_for(protocol.read(reader), Worker.CONNECT_TIMEOUT)
+            except asyncio.IncompleteReadError:
+                writer.close()
+                raise ConnectionError(f"Worker {self.name} refused the connection.")
+            hello = protocol.load(payload)
+            self.cpus = hello.get('cpus', 1)
+            self.running = hello.get('running', 0)
+            self._reader, self._writer = reader, writer
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        try:
+            while True:
+                kind, payload = await protocol.read(self._reader)
+                if kind == protocol.OUTPUT:
+                    id, data = protocol.split_output(payload)
+                    proc = self._procs.get(id)
+                    if proc is not None:
+                        proc.stdout.feed_data(data)
+                        await proc.stdout.drain()
+                    continue
+
+                message = protocol.load(payload)
+                if kind == protocol.LOAD:
+                    self.running = message['running']
+                    continue
+                proc = self._procs.get(message.get('id'))
+                if proc is None: continue
+                if kind == protocol.STARTED:
+                    proc._started.set_result(None)
+                elif kind == protocol.ERROR:
+                    del self._procs[proc._id]
+                    proc._started.set_exception(OSError(message['error']))
+                elif kind == protocol.EXIT:
+                    del self._procs[proc._id]
+                    proc._exit(message['returncode'])
+        except (asyncio.IncompleteReadError, ConnectionError, protocol.ProtocolError):
+            pass
+        finally:
+            self._writer.close()
+            self._reader = self._writer = None
+            for proc in self._procs.values():
+                if not proc._started.done():
+                    proc._started.set_exception(ConnectionError(f"Lost connection to worker {self.name}."))
+                proc.stdout.feed_data(f"\nLost connection to worker {self.name}.\n".encode())
+                proc._exit(-1)
+            self._procs.clear()
+
+    async def run(self, args):
+        await self.connect()
+        proc = RemoteProcess(self, next(self._ids))
+        self._procs[proc._id] = proc
+        protocol.send(self._writer, protocol.RUN, id=proc._id, args=list(args))
+        await proc._started
+        return proc
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
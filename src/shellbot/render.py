@@ -0,0 +1,129 @@
+import asyncio
+import collections
+import time
+import traceback
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+
+    async def take(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self._tokens < 1:
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+            self._tokens = 1
+            self._stamp = time.monotonic()
+        self._tokens -= 1
+
+class Channel:
+    def __init__(self, renderer):
+        self._renderer = renderer
+        self._bucket = TokenBucket(renderer.rate, renderer.burst)
+        self._pending = {}
+        self._task = None
+
+    def submit(self, window, view, content, since):
+        if view in self._pending:
+            since = self._pending[view][2]
+        self._pending[view] = (window, content, since)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        try:
+            while self._pending:
+                view = next(iter(self._pending))
+                window, content, since = self._pending[view]
+                if view.closed or view.shows(content):
+                    del self._pending[view]
+                    self._renderer.skipped += not view.closed
+                    continue
+
+                await self._bucket.take()
+                window, content, since = self._pending.pop(view)
+                if await view.render(content, window.scrollable):
+                    self._renderer._record(time.monotonic() - since)
+                elif view.closed:
+                    window.drop_view(view)
+                else:
+                    self._renderer.skipped += 1
+        finally:
+            self._task = None
+
+class Renderer:
+    def __init__(self, rate=1.0, burst=5, history=1000):
+        self.rate = rate
+        self.burst = burst
+        self._dirty = {}
+        self._wake = None
+        self._task = None
+        self._channels = {}
+        self._latency = collections.deque(maxlen=history)
+        self.edits = 0
+        self.skipped = 0
+        self.failures = 0
+
+    def mark(self, window):
+        if window in self._dirty: return
+        self._dirty[window] = time.monotonic()
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._wake.set()
+
+    async def _run(self):
+        try:
+            while True:
+                await self._wake.wait()
+                self._wake.clear()
+                dirty, self._dirty = self._dirty, {}
+                for window, since in dirty.items():
+                    # Views pinned to an earlier page are left as they are.
+                    views = [view for view in window.views if view.offset is None]
+                    if not views: continue
+                    try:
+                        content = window._build()
+                    except Exception:
+                        # One broken window must not stop every other view.
+                        self.failures += 1
+                        traceback.print_exc()
+                        continue
+                    for view in views:
+                        self.submit(window, view, content, since)
+        finally:
+            self._task = None
+
+    def submit(self, window, view, content, since=None):
+        channel = self._channels.get(view.channel_id)
+        if channel is None:
+            channel = self._channels[view.channel_id] = Channel(self)
+        channel.submit(window, view, content, time.monotonic() if since is None else since)
+
+    def _record(self, latency):
+        self.edits += 1
+        self._latency.append(latency)
+
+    def stats(self):
+        latency = sorted(self._latency)
+        def percentile(p):
+            if not latency: return None
+            return latency[min(len(latency) - 1, int(p * len(latency)))]
+
+        return {'edits': self.edits,
+                'skipped': self.skipped,
+                'failures': self.failures,
+                'pending': sum(len(c._pending) for c in self._channels.values()),
+                'latency_p50': percentile(0.5),
+                'latency_p90': percentile(0.9),
+                'latency_p99': percentile(0.99),
+                'latency_max': latency[-1] if latency else None}
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
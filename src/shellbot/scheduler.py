@@ -0,0 +1,148 @@
+import asyncio
+import collections
+import heapq
+import itertools
+from typing import Optional
+
+class Entry:
+    def __init__(self, job, user, priority, slots, tag, seq):
+        self.job = job
+        self.user = user
+        self.priority = priority
+        self.slots = slots
+        self.tag = tag
+        self.seq = seq
+        self.future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other):
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+class Scheduler:
+    def __init__(self,
+                 slots: Optional[int] = None,
+                 tags: Optional[dict] = None,
+                 ):
+        self.slots = slots
+        self.tags = dict(tags or {})
+        self._used = 0
+        self._tag_used = collections.Counter()
+        self._queues = {}
+        self._entries = {}
+        self._started = {}
+        self._seq = itertools.count()
+        self._starts = itertools.count()
+
+    def check(self, slots, tag=None):
+        if slots < 1:
+            raise ValueError("A job needs at least one slot.")
+        if self.slots is not None and slots > self.slots:
+            raise ValueError(f"A job can use at most {self.slots} slots.")
+        if tag in self.tags and slots > self.tags[tag]:
+            raise ValueError(f"A job tagged {tag} can use at most {self.tags[tag]} slots.")
+
+    def _fits(self, entry):
+        if self.slots is not None and self._used + entry.slots > self.slots:
+            return False
+        cap = self.tags.get(entry.tag)
+        if cap is not None and self._tag_used[entry.tag] + entry.slots > cap:
+            return False
+        return True
+
+    def _dispatch(self):
+        # Among the head of each user's queue, start the highest priority
+        # job that fits, preferring users who started a job least recently.
+        while True:
+            best = None
+            for user, queue in self._queues.items():
+                entry = queue[0]
+                if not self._fits(entry): continue
+                key = (-entry.priority, self._started.get(user, -1), entry.seq)
+                if best is None or key < best[0]:
+                    best = (key, entry)
+            if best is None: return
+
+            entry = best[1]
+            heapq.heappop(self._queues[entry.user])
+            if not self._queues[entry.user]:
+                del self._queues[entry.user]
+            del self._entries[entry.job.id]
+            self._used += entry.slots
+            self._tag_used[entry.tag] += entry.slots
+            self._started[entry.user] = next(self._starts)
+            entry.future.set_result(None)
+
+    def _release(self, entry):
+        self._used -= entry.slots
+        self._tag_used[entry.tag] -= entry.slots
+        self._dispatch()
+
+    def position(self, job):
+        # Replays _dispatch's choices, assuming every job fits when its
+        # turn comes; a job waiting for slots may still be overtaken.
+        entry = self._entries.get(job.id)
+        if entry is None: return None
+        queues = {user: sorted(queue) for user, queue in self._queues.items()}
+        started = dict(self._started)
+        starts = itertools.count(max(started.values(), default=-1) + 1)
+        for position in itertools.count(1):
+            user = min(queues, key=lambda u: (-queues[u][0].priority, started.get(u, -1), queues[u][0].seq))
+            head = queues[user].pop(0)
+            if head is entry: return position
+            if not queues[user]: del queues[user]
+            started[user] = next(starts)
+
+    def _remove(self, entry):
+        del self._entries[entry.job.id]
+        queue = self._queues[entry.user]
+        queue.remove(entry)
+        if queue:
+            heapq.heapify(queue)
+        else:
+            del self._queues[entry.user]
+
+    def cancel(self, job):
+        entry = self._entries.get(job.id)
+        if entry is None: return False
+        self._remove(entry)
+        entry.future.cancel()
+        return True
+
+    def reconfigure(self, slots=None, tags=None):
+        self.slots = slots
+        self.tags = dict(tags or {})
+        # Queued jobs too large for the new limits would wait forever.
+        for entry in list(self._entries.values()):
+            try:
+                self.check(entry.slots, entry.tag)
+            except ValueError as e:
+                self._remove(entry)
+                entry.future.set_exception(e)
+        self._dispatch()
+
+    async def run(self, job, user, priority=0, slots=1, tag=None):
+        self.check(slots, tag)
+        entry = Entry(job, user, priority, slots, tag, next(self._seq))
+        self._entries[job.id] = entry
+        heapq.heappush(self._queues.setdefault(user, []), entry)
+        job.status = 'queued'
+        self._dispatch()
+
+        try:
+            await asyncio.shield(entry.future)
+        except ValueError as e:
+            job.cancel(f"Cancelled before it started: {e}")
+            return
+        except asyncio.CancelledError:
+            if entry.future.cancelled():
+                job.cancel()
+                return
+            if entry.future.done():
+                self._release(entry)
+            else:
+                self.cancel(job)
+            raise
+
+        try:
+            await job.start()
+        finally:
+            self._release(entry)
@@ -0,0 +1,93 @@
+import re
+import array
+
+BLOCK = 64 # events per index block, matching SpillStore.STRIDE
+MAX_MATCHES = 200
+
+class Trigrams:
+    # Maps each lowercased trigram to the blocks of events containing it,
+    # so literal searches only read the blocks that can match.
+    def __init__(self):
+        self.count = 0
+        self._blocks = {}
+        self._seen = set()
+
+    def add(self, text):
+        block = self.count // BLOCK
+        if self.count % BLOCK == 0:
+            self._seen = set()
+        self.count += 1
+        text = text.lower()
+        for i in range(len(text) - 2):
+            gram = text[i:i + 3]
+            if gram in self._seen: continue
+            self._seen.add(gram)
+            blocks = self._blocks.get(gram)
+            if blocks is None:
+                blocks = self._blocks[gram] = array.array('I')
+            blocks.append(block)
+
+    def candidates(self, literal):
+        literal = literal.lower()
+        grams = {literal[i:i + 3] for i in range(len(literal) - 2)}
+        if not grams: return None
+        found = None
+        for gram in sorted(grams, key=lambda g: len(self._blocks.get(g, ()))):
+            blocks = self._blocks.get(gram)
+            if blocks is None: return []
+            found = set(blocks) if found is None else found.intersection(blocks)
+            if not found: return []
+        return sorted(found)
+
+def literal(pattern):
+    # The pattern itself when it contains no regex syntax.
+    return pattern if re.search(r'[.^$*+?{}\[\]\\|()]', pattern) is None else None
+
+def grep(read, n, regex, context=0, blocks=None, limit=MAX_MATCHES):
+    # Returns [(index, event, matched)] in order, with context events and
+    # None between non-adjacent groups, and whether matches were cut at limit.
+    ranges = [(0, n)] if blocks is None else [(b * BLOCK, min(n, (b + 1) * BLOCK)) for b in blocks]
+    matches = []
+    truncated = False
+    for lo, hi in ranges:
+        if lo >= hi: continue
+        for i, event in enumerate(read(lo, hi), lo):
+            if regex.search(event.text):
+                if len(matches) == limit:
+                    truncated = True
+                    break
+                matches.append(i)
+        if truncated: break
+
+    groups = []
+    for i in matches:
+        lo, hi = max(0, i - context), min(n, i + context + 1)
+        if groups and lo <= groups[-1][1]:
+            groups[-1][1] = hi
+        else:
+            groups.append([lo, hi])
+
+    matched = set(matches)
+    result = []
+    for lo, hi in groups:
+        if result: result.append(None)
+        for i, event in enumerate(read(lo, hi), lo):
+            result.append((i, event, i in matched))
+    return result, truncated
+
+def render(job_id, pattern, result, truncated, width=120):
+    lines = [f"--- JOB ID {job_id} :: grep {pattern}"]
+    if not result:
+        lines.append("    no matches")
+    pad = len(str(max((r[0] for r in result if r), default=0) + 1))
+    for entry in result:
+        if entry is None:
+            lines.append("    ...")
+            continue
+        i, event, matched = entry
+        text = event.text.replace('\n', ' ')
+        if len(text) > width: text = text[:width - 3] + '...'
+        lines.append(('+  ' if matched else '   ') + str(i + 1).rjust(pad) + ': ' + text)
+    if truncated:
+        lines.append(f"--- only the first {MAX_MATCHES} matches are shown")
+    return lines
@@ -0,0 +1,106 @@
+import math
+import array
+from shellbot.usage import clock
+
+TAGS = {'[[PRG]]': 'progress',
+        '[[MET]]': 'metric'}
+SPARKS = '▁▂▃▄▅▆▇█'
+
+def parse(data):
+    # [[PRG]] <time> <done> <total or -> <name>
+    # [[MET]] <time> <value> <name>
+    kind = TAGS.get(data[:7])
+    if kind is None: return None
+    fields = data[7:].split(None, 3 if kind == 'progress' else 2)
+    try:
+        if kind == 'progress':
+            t, value, total, name = fields
+            total = None if total == '-' else float(total)
+        else:
+            t, value, name = fields
+            total = None
+        t, value = float(t), float(value)
+    except ValueError:
+        return None
+    if not all(map(math.isfinite, [t, value, total or 0])): return None
+    return kind, name, t, value, total
+
+def number(value):
+    return str(int(value)) if value == int(value) and abs(value) < 1e15 else f"{value:.4g}"
+
+class Series:
+    SIZE = 32
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.total = None
+        self.count = 0
+        self.last = None
+        self.start = None
+        # At most 2 * SIZE buckets of `step` samples each; when full,
+        # neighbouring buckets are merged and the step doubles.
+        self.values = array.array('d')
+        self.times = array.array('d')
+        self.step = 1
+        self._filled = 0
+
+    def _halve(self):
+        merge = (lambda a, b: (a + b) / 2) if self.kind == 'metric' else (lambda a, b: b)
+        self.values = array.array('d', (merge(self.values[i], self.values[i + 1])
+                                        for i in range(0, len(self.values), 2)))
+        self.times = array.array('d', self.times[1::2])
+        self.step *= 2
+
+    def add(self, t, value, total=None):
+        if self.start is None: self.start = t
+        if total is not None: self.total = total
+        self.count += 1
+        self.last = value
+        if self._filled == 0:
+            if len(self.values) == 2 * Series.SIZE:
+                self._halve()
+            self.values.append(value)
+            self.times.append(t)
+        else:
+            if self.kind == 'metric':
+                self.values[-1] += (value - self.values[-1]) / (self._filled + 1)
+            else:
+                self.values[-1] = value
+            self.times[-1] = t
+        self._filled = (self._filled + 1) % self.step
+
+    def rate(self):
+        k = max(0, len(self.values) - 8)
+        dt = self.times[-1] - self.times[k]
+        if dt <= 0: return None
+        return (self.values[-1] - self.values[k]) / dt
+
+    def spark(self, width=SIZE):
+        values = self.values[-width:]
+        lo, hi = min(values), max(values)
+        if hi == lo: return SPARKS[0] * len(values)
+        scale = (len(SPARKS) - 1) / (hi - lo)
+        return ''.join(SPARKS[round((v - lo) * scale)] for v in values)
+
+    def finished(self):
+        return self.kind == 'progress' and self.total is not None and self.last >= self.total
+
+    def render(self):
+        if self.kind == 'metric':
+            return (f"{self.name} {number(self.last)} {self.spark()} "
+                    f"[{number(min(self.values))}, {number(max(self.values))}]")
+
+        text = f"{self.name} {number(self.last)}"
+        rate = self.rate()
+        if self.total:
+            fraction = max(0.0, min(1.0, self.last / self.total))
+            bar = int(20 * fraction)
+            text += f"/{number(self.total)} {100 * fraction:.0f}% |{'#' * bar}{' ' * (20 - bar)}|"
+        if self.finished():
+            text += f" in {clock(self.times[-1] - self.start)}"
+        elif rate:
+            text += f" {rate:.3g}/s"
+            if self.total and rate > 0:
+                text += f" eta {clock((self.total - self.last) / rate)}"
+        return text
@@ -2,11 +2,25 @@ import discord
 from discord.ext import commands
 import asyncio
 from typing import Optional
-from shellbot.job import Job
+from shellbot.job import Job, STATUS_PREFIXES
+from shellbot.journal import Journal
+from shellbot.sweep import Sweep, expand, instantiate
+from shellbot.remote import Worker
 from shellbot.complete import Complete
 from shellbot.idlist import IdList
+from shellbot.store import SpillStore
+from shellbot.render import Renderer
+from shellbot.registry import Registry
+from shellbot.scheduler import Scheduler
+from shellbot.stats import stats
+import heapq
+from shellbot.window import Event
+from shellbot import search
+from shellbot.upload import COMPRESSIONS, TooLarge, spool, split, suffix, write_path, write_text
 import os
-import shutil
+import re
+import tempfile
+import functools
 import time
 
 
@@ -17,10 +31,33 @@ class PermissionError(discord.errors.CheckFailure):
 CommandError = discord.errors.ApplicationCommandError
 
 class Shellbot(discord.Bot):
+    # Without the members intent no role changes arrive, so cached
+    # permission decisions also expire after a while.
+    PERMISSION_TTL = 60
+    MAX_PERMISSIONS = 10000
+
     def __init__(self,
                  roles: Optional[list | dict] = None,
                  users: Optional[list | dict] = None,
                  intents: Optional[discord.Intents] = None,
+                 history_dir: Optional[str] = None,
+                 history_budget: int = 1 << 20,
+                 edit_rate: float = 1.0,
+                 edit_burst: int = 5,
+                 max_finished_jobs: Optional[int] = None,
+                 max_job_age: Optional[float] = None,
+                 max_upload_size: int = 10 << 20,
+                 max_upload_parts: int = 20,
+                 max_lines_per_second: Optional[float] = 1000,
+                 max_bytes_per_second: Optional[float] = 1 << 20,
+                 job_slots: Optional[int] = None,
+                 tag_slots: Optional[dict] = None,
+                 sample_interval: Optional[float] = 10,
+                 stats_enabled: bool = False,
+                 stats_file: Optional[str] = None,
+                 stats_interval: float = 15,
+                 search_index: bool = False,
+                 workers: Optional[dict] = None,
                  ):
         if intents is None:
             intents = discord.Intents(reactions=True)
@@ -28,7 +65,41 @@ class Shellbot(discord.Bot):
         super().__init__(intents=intents)
         self._roles = IdList(roles)
         self._users = IdList(users)
-        self._jobs = set()
+        self._permissions = {}
+        self._jobs = Registry(max_finished=max_finished_jobs, max_age=max_job_age)
+        self._history_dir = history_dir
+        self._history_budget = history_budget
+        self._history_temp = None
+        self._journal = None
+        self._detached = []
+        if history_dir is not None:
+            self._journal = Journal(self._history_path('jobs.jsonl'))
+            Job.id_counter = max(Job.id_counter, self._journal.next_id())
+            for id, meta in self._journal.jobs.items():
+                if meta.get('status') in ['success', 'fail']: continue
+                # Jobs left running by the previous run are reattached once
+                # connected; queued ones never started.
+                if meta.get('status') == 'running' and os.path.exists(self._state_path(id)):
+                    self._detached.append(id)
+                else:
+                    self._journal.record(id, status='fail')
+        self._renderer = Renderer(rate=edit_rate, burst=edit_burst)
+        self._max_upload_size = max_upload_size
+        self._max_upload_parts = max_upload_parts
+        self._max_lines = max_lines_per_second
+        self._max_bytes = max_bytes_per_second
+        self._scheduler = Scheduler(slots=job_slots, tags=tag_slots)
+        self._sample_interval = sample_interval
+        self._stats_file = stats_file
+        self._stats_interval = stats_interval
+        self._stats_tasks = []
+        self._tasks = []
+        self._search_index = search_index
+        self._workers = {}
+        for name, worker in (workers or {}).items():
+            if isinstance(worker, str): worker = {'address': worker}
+            self._workers[name] = Worker(name, **worker)
+        stats.enabled = stats_enabled or stats_file is not None
 
         def permitted(ctx):
             if not self.permitted(ctx.author):
@@ -49,51 +120,127 @@ class Shellbot(discord.Bot):
             await ctx.respond("Bye!", ephemeral=True)
             await self.close()
 
+        @self.slash_command(name="stats", description="Shows the bot's performance statistics.")
+        @check_permission
+        async def stats_(ctx):
+            buff = [f"{name} {value}" for name, value in sorted(self.gauges().items())]
+            if stats.enabled:
+                buff += stats.summary()
+            else:
+                buff.append("# timers and counters are disabled (stats_enabled)")
+            text = "\n".join(buff)[:1900]
+            await ctx.respond("```\n" + text + "\n```", ephemeral=True)
+
         @self.slash_command(description="Pings the bot.")
         async def ping(ctx):
             await ctx.respond("Pong.", ephemeral=True)
 
+        async def respond_files(ctx, f, name, limit):
+            for batch in await split(f, name, limit):
+                await ctx.respond(files=[discord.File(fp, filename=n) for n, fp in batch])
+
+        def total_limit(limit, parts):
+            return limit * self._max_upload_parts if parts else limit
+
+        def too_large(limit, parts):
+            return CommandError(str(TooLarge(limit, self._max_upload_parts if parts else None)))
+
+        async def respond_path(ctx, path, name, compression, parts):
+            limit = self.upload_limit(ctx)
+            if os.path.isfile(path) and compression == 'none':
+                if os.path.getsize(path) > total_limit(limit, parts):
+                    raise too_large(limit, parts)
+                await ctx.defer()
+                with open(path, 'rb') as f:
+                    await respond_files(ctx, f, name, limit)
+                return
+
+            await ctx.defer()
+            name += '.zip' if os.path.isdir(path) else suffix(compression)
+            with spool() as f:
+                try:
+                    await write_path(f, path, compression, total_limit(limit, parts))
+                except TooLarge:
+                    raise too_large(limit, parts)
+                await respond_files(ctx, f, name, limit)
+
         @self.slash_command(description="Uploads a given file to Discord.")
         @check_permission
-        async def upload(ctx, path: str):
+        async def upload(ctx, 
+                         path: str,
+                         compression: discord.Option(str, choices=list(COMPRESSIONS), default='none'),
+                         parts: discord.Option(bool, description="Split large files into parts.", default=False)
+                         ):
             if not os.path.exists(path): raise CommandError("Could not read the file")
-            await ctx.defer()
-
-            if os.path.isdir(path):
-                temp_filename = f"temp_{time.time()}"
-                shutil.make_archive(temp_filename, 'zip', path)
-                temp_filename += '.zip'
-                display_filename = os.path.basename(path) + '.zip'
-                f = open(temp_filename, 'rb')
-            else:
-                temp_filename = None
-                display_filename = os.path.basename(path)
-                f = open(path, 'rb')
-        
-            await ctx.respond(file=discord.File(f, filename=display_filename))
-            f.close()
-
-            if temp_filename:
-                os.remove(temp_filename)
+            name = os.path.basename(os.path.normpath(path))
+            await respond_path(ctx, path, name, compression, parts)
 
         job_group = self.create_group(name="job")
 
         complete_job_id = Complete(self, lambda: [job.id for job in self._jobs])
-        complete_command = Complete(self)
+        complete_host = Complete(self, lambda: ['local', 'auto', *self._workers])
+        complete_command = Complete(self, path=None if history_dir is None else
+                                    self._history_path('commands.json'))
 
         @job_group.command(name="run", description="Starts a new job.")
         @check_permission
         async def job_run(ctx, 
-                          command: discord.Option(str, autocomplete=complete_command.autocomplete)
+                          command: discord.Option(str, autocomplete=complete_command.autocomplete),
+                          priority: discord.Option(int, description="Higher runs first when queued.", default=0),
+                          slots: discord.Option(int, description="CPU slots the job occupies.", default=1),
+                          tag: discord.Option(str, description="Tag with its own slot limit.", default=None),
+                          host: discord.Option(str, description="Worker to run on, or auto for the least loaded.",
+                                               autocomplete=complete_host.autocomplete, default=None)
                           ):
-            job = Job(command.split(' '))
-            self._jobs.add(job)
+            try:
+                self._scheduler.check(slots, tag)
+            except ValueError as e:
+                raise CommandError(str(e))
+            if host not in [None, 'local', 'auto'] and host not in self._workers:
+                raise CommandError(f"Unknown worker {host}.")
+            if host == 'auto':
+                await ctx.defer()
+                host = await self.place_job()
+
+            job = self.create_job(command.split(' '), None if host == 'local' else host)
 
             complete_command.update_history(ctx, command)
             complete_job_id.update_history(ctx, job.id)
 
-            await job.view(ctx)
-            await job.start()
+            await self.run_job(ctx, job, priority, slots, tag)
+
+        @job_group.command(name="sweep", description="Runs a command for every combination of parameters.")
+        @check_permission
+        async def job_sweep(ctx,
+                            command: discord.Option(str, description="Command with {name} placeholders."),
+                            grid: discord.Option(str, description="Values of each name, e.g. lr=0.1,0.01 seed=1,2"),
+                            max_parallel: discord.Option(int, description="Children running at once.", default=None),
+                            priority: discord.Option(int, description="Higher runs first when queued.", default=0),
+                            slots: discord.Option(int, description="CPU slots each child occupies.", default=1),
+                            tag: discord.Option(str, description="Tag with its own slot limit.", default=None),
+                            host: discord.Option(str, description="Worker to run on, or auto to spread the children.",
+                                                 autocomplete=complete_host.autocomplete, default=None)
+                            ):
+            try:
+                self._scheduler.check(slots, tag)
+                runs = expand(grid)
+                for params in runs:
+                    instantiate(command, params)
+            except ValueError as e:
+                raise CommandError(str(e))
+            if max_parallel is not None and max_parallel < 1:
+                raise CommandError("max_parallel must be at least 1.")
+            if host not in [None, 'local', 'auto'] and host not in self._workers:
+                raise CommandError(f"Unknown worker {host}.")
+            if host == 'auto':
+                await ctx.defer()
+
+            sweep = await self.create_sweep(command, runs, None if host == 'local' else host, max_parallel)
+
+            complete_command.update_history(ctx, command)
+            complete_job_id.update_history(ctx, sweep.id)
+
+            await self.run_sweep(ctx, sweep, priority, slots, tag)
 
         @job_group.command(name="view", description="Opens a new view for a job.")
         @check_permission
@@ -107,20 +254,29 @@ class Shellbot(discord.Bot):
         @job_group.command(name="dump", description="Uploads a job's entire output to Discord.")
         @check_permission
         async def job_dump(ctx, 
-                           job: discord.Option(int, autocomplete=complete_job_id.autocomplete)
+                           job: discord.Option(int, autocomplete=complete_job_id.autocomplete),
+                           compression: discord.Option(str, choices=list(COMPRESSIONS), default='none'),
+                           parts: discord.Option(bool, description="Split large output into parts.", default=False),
+                           full: discord.Option(bool, description="Upload the unfiltered raw output.", default=False)
                            ):
             j = job_by_id(job)
             complete_job_id.update_history(ctx, job)
-            await ctx.defer()
-            temp_filename = f"temp_{time.time()}.txt"
-            with open(temp_filename, 'w') as f:
-                f.write(j._window._build(raw=True))
-                f.close()
-
-            with open(temp_filename, 'rb') as f:
-                await ctx.respond(file=discord.File(f, filename=f"job_{id}.txt"))
+            if full:
+                path = j.output()
+                if path is None or not os.path.exists(path):
+                    raise CommandError(f"Job ID {job} has no raw output.")
+                await respond_path(ctx, path, f"job_{job}.out", compression, parts)
+                return
 
-            os.remove(temp_filename)
+            await ctx.defer()
+            limit = self.upload_limit(ctx)
+            name = f"job_{job}.txt" + suffix(compression)
+            with spool() as f:
+                try:
+                    await write_text(f, j.dump(), compression, total_limit(limit, parts))
+                except TooLarge:
+                    raise too_large(limit, parts)
+                await respond_files(ctx, f, name, limit)
 
         @job_group.command(name='kill', description="Kills a job.")
         @check_permission
@@ -130,9 +286,44 @@ class Shellbot(discord.Bot):
             j = job_by_id(job)
             complete_job_id.update_history(ctx, job)
             await ctx.defer(ephemeral=True)
-            await j.kill()
+            await self.kill_job(j)
             await ctx.respond("Killed.", ephemeral=True)
 
+        @job_group.command(name="grep", description="Searches the output of a job, or of all jobs.")
+        @check_permission
+        async def job_grep(ctx,
+                           pattern: discord.Option(str, description="Regular expression."),
+                           job: discord.Option(int, autocomplete=complete_job_id.autocomplete, default=None),
+                           context: discord.Option(int, description="Lines of context around matches.", default=0),
+                           ignore_case: discord.Option(bool, default=False)
+                           ):
+            try:
+                regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+            except re.error as e:
+                raise CommandError(f"Invalid pattern: {e}")
+            if job is None:
+                jobs = list(self._jobs)
+            else:
+                jobs = [job_by_id(job)]
+                complete_job_id.update_history(ctx, job)
+
+            await ctx.defer(ephemeral=True)
+            buff = []
+            for j in jobs:
+                result, truncated = await j.search(regex, pattern, max(0, context))
+                if job is None and not result: continue
+                buff += search.render(j.id, pattern, result, truncated)
+            if not buff:
+                buff.append("--- No matches found")
+
+            text = ""
+            for i, line in enumerate(buff):
+                if len(text) + len(line) > 1900:
+                    text += f"--- {len(buff) - i} more lines not shown\n"
+                    break
+                text += line + "\n"
+            await ctx.respond("```diff\n" + text + "```", ephemeral=True)
+
         @job_group.command(name="list", description="Lists all jobs.")
         @check_permission
         async def job_list(ctx):
@@ -142,11 +333,10 @@ class Shellbot(discord.Bot):
 
             pad = len(str(Job.id_counter))
             buff = []
-            for j in sorted(self._jobs, key=lambda j: -j.id)[:10]:
-                prefix = {'running': '>',
-                          'success': '+',
-                          'fail': '-'}.get(j.status, '').ljust(3)
-                buff.append(prefix + str(j.id).ljust(pad) + ' :: ' + str(j.args))
+            for j in heapq.nlargest(10, self._jobs, key=lambda j: j.id):
+                prefix = STATUS_PREFIXES.get(j.status, '').ljust(3)
+                host = f" @ {j.host}" if j.host else ""
+                buff.append(prefix + str(j.id).ljust(pad) + ' :: ' + str(j.args) + host)
 
             await ctx.respond("```diff\n" + "\n".join(buff) + "\n```", ephemeral=True)
 
@@ -158,89 +348,305 @@ class Shellbot(discord.Bot):
             j = job_by_id(job)
             complete_job_id.update_history(ctx, job)
 
-            prefix = {'running': '>',
-                      'success': '+',
-                      'fail': '-'}.get(j.status, '').ljust(3)
+            prefix = STATUS_PREFIXES.get(j.status, '').ljust(3)
+            position = self._scheduler.position(j)
+            queued = f"\n{prefix}queued at position {position}" if position else ""
+            usage = f"\n{prefix}{j.usage.summary()}" if j.usage else ""
+            host = f" @ {j.host}" if j.host else ""
 
             await ctx.respond("```diff\n" 
                               + prefix + str(j.id) + ' :: ' 
-                              + str(j.args) + "\n```",
+                              + str(j.args) + host + queued + usage + "\n```",
                               ephemeral=True)
 
     async def on_application_command_error(self, ctx, error):
         await ctx.respond(str(error), ephemeral=True)
 
     def job_by_view(self, message):
-        for job in self._jobs:
-            if job.has_view(message): 
-                return job
+        job, _ = self._jobs.by_message(message.id)
+        return job
 
     def permitted(self, user):
+        guild = getattr(user, 'guild', None)
+        key = (guild.id if guild else None, user.id)
+        now = time.monotonic()
+        cached = self._permissions.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        if len(self._permissions) >= Shellbot.MAX_PERMISSIONS:
+            self._permissions.clear()
+        decision = self._decide(user)
+        self._permissions[key] = (decision, now + Shellbot.PERMISSION_TTL)
+        return decision
+
+    def _decide(self, user):
         if user.id in self._users: return True
-        if self._roles.any([i.id for i in user.roles if i]): return True
+        if self._roles.any([i.id for i in getattr(user, 'roles', []) if i]): return True
         return False
 
+    def _forget(self, guild_id, user_id=None):
+        if user_id is not None:
+            self._permissions.pop((guild_id, user_id), None)
+            return
+        for key in [key for key in self._permissions if key[0] == guild_id]:
+            del self._permissions[key]
+
+    async def on_member_update(self, before, after):
+        if before.roles != after.roles:
+            self._forget(after.guild.id, after.id)
+
+    async def on_member_remove(self, member):
+        self._forget(member.guild.id, member.id)
+
+    async def on_guild_role_delete(self, role):
+        self._forget(role.guild.id)
+
     def job_by_id(self, id):
-        for job in self._jobs:
-            if job.id == id:
-                return job
-        return None
+        job = self._jobs.get(id)
+        if job is None and self._journal is not None:
+            job = self._restore_job(id)
+        return job
+
+    def _restore_job(self, id, reattach=False):
+        meta = self._journal.jobs.get(id)
+        if meta is None or 'args' not in meta: return None
+        job = Job(meta['args'],
+                  id=id,
+                  store=functools.partial(self._store, resume=not reattach),
+                  renderer=self._renderer,
+                  registry=self._jobs,
+                  log=self._log_path,
+                  max_lines=self._max_lines,
+                  max_bytes=self._max_bytes,
+                  sample_interval=self._sample_interval,
+                  journal=self._journal,
+                  state=self._state_path,
+                  index=reattach and self._search_index,
+                  host=meta.get('host'))
+        self._jobs.add(job)
+        if not reattach:
+            job.restore(meta.get('status', 'fail'), meta.get('returncode'))
+            self._jobs.finish(job)
+        return job
+
+    async def reattach_job(self, id):
+        job = self._restore_job(id, reattach=True)
+        try:
+            await job.reattach()
+        finally:
+            self._jobs.finish(job)
+
+    def create_job(self, args, host=None):
+        remote = host is not None
+        job = Job(args,
+                  store=self._store,
+                  renderer=self._renderer,
+                  registry=self._jobs,
+                  log=self._log_path,
+                  max_lines=self._max_lines,
+                  max_bytes=self._max_bytes,
+                  sample_interval=self._sample_interval,
+                  journal=self._journal,
+                  # Detaching only pays off if a later run can reattach.
+                  state=self._state_path if self._journal is not None and not remote else None,
+                  index=self._search_index,
+                  runner=self._workers[host].run if remote else None,
+                  host=host)
+        if self._journal is not None:
+            self._journal.create(job.id, args, host)
+        self._jobs.add(job)
+        return job
+
+    def _load(self, host):
+        if host is None:
+            active = sum(j.host is None and j.status in ['queued', 'running'] for j in self._jobs)
+            return active / (os.cpu_count() or 1)
+        worker = self._workers[host]
+        # The worker's own count includes jobs started by other bots.
+        queued = sum(j.host == host and j.status == 'queued' for j in self._jobs)
+        return worker.load + queued / worker.cpus
+
+    async def _reachable(self):
+        # Probed together, so unreachable workers cost one timeout in total.
+        names = list(self._workers)
+        results = await asyncio.gather(*(self._workers[name].connect() for name in names),
+                                       return_exceptions=True)
+        return [name for name, result in zip(names, results) if result is None]
+
+    def _place(self, hosts):
+        # The least loaded of this host and the given workers.
+        return min([None, *hosts], key=self._load)
+
+    async def place_job(self):
+        return self._place(await self._reachable())
+
+    async def run_job(self, ctx, job, priority=0, slots=1, tag=None):
+        job.status = 'queued'
+        await job.view(ctx)
+        try:
+            await self._scheduler.run(job, ctx.author.id, priority, slots, tag)
+        finally:
+            self._jobs.finish(job)
+
+    async def create_sweep(self, template, runs, host=None, limit=None):
+        sweep = Sweep(template,
+                      renderer=self._renderer,
+                      registry=self._jobs,
+                      limit=limit,
+                      host=host)
+        self._jobs.add(sweep)
+        # With auto, the workers are probed once and each child goes
+        # wherever is least loaded counting the children placed so far.
+        hosts = await self._reachable() if host == 'auto' else None
+        for params in runs:
+            child_host = self._place(hosts) if host == 'auto' else host
+            sweep.add(params, self.create_job(instantiate(template, params), child_host))
+        return sweep
+
+    async def run_sweep(self, ctx, sweep, priority=0, slots=1, tag=None):
+        async def schedule(job):
+            try:
+                await self._scheduler.run(job, ctx.author.id, priority, slots, tag)
+            finally:
+                self._jobs.finish(job)
+
+        await sweep.view(ctx)
+        try:
+            await sweep.run(schedule)
+        finally:
+            self._jobs.finish(sweep)
+
+    async def kill_job(self, job):
+        if isinstance(job, Sweep):
+            job.stop()
+            await asyncio.gather(*(self.kill_job(child) for _, child in job.children))
+            return
+        if not self._scheduler.cancel(job):
+            await job.kill()
 
-    def set(self, **kwargs):
-        if 'users' in kwargs:
-            self._users = IdList(kwargs['users'])
-        if 'roles' in kwargs:
-            self._roles = IdList(kwargs['roles'])
+    def upload_limit(self, ctx):
+        limit = self._max_upload_size
+        if ctx.guild is not None:
+            limit = min(limit, ctx.guild.filesize_limit)
+        return limit
+
+    def _history_path(self, name):
+        if self._history_dir is None:
+            self._history_temp = tempfile.TemporaryDirectory(prefix='shellbot_')
+            self._history_dir = self._history_temp.name
+        os.makedirs(self._history_dir, exist_ok=True)
+        return os.path.join(self._history_dir, name)
+
+    def _store(self, job_id, resume=False):
+        path = self._history_path(f"job_{job_id}.jsonl")
+        return SpillStore(Event, path, budget=self._history_budget, resume=resume)
 
+    def _log_path(self, job_id):
+        return self._history_path(f"job_{job_id}.out")
+
+    def _state_path(self, job_id):
+        return self._history_path(f"job_{job_id}.state")
+
+    def set(self, **kwargs):
+        # Both lists are parsed first, so a bad one leaves the old ones in place.
+        users = IdList(kwargs['users']) if 'users' in kwargs else self._users
+        roles = IdList(kwargs['roles']) if 'roles' in kwargs else self._roles
+        self._users, self._roles = users, roles
+        self._permissions.clear()
+        if 'max_finished_jobs' in kwargs:
+            self._jobs.max_finished = kwargs['max_finished_jobs']
+            self._jobs.evict()
+        if 'job_slots' in kwargs or 'tag_slots' in kwargs:
+            self._scheduler.reconfigure(kwargs.get('job_slots', self._scheduler.slots),
+                                        kwargs.get('tag_slots', self._scheduler.tags))
+        if 'max_job_age' in kwargs:
+            self._jobs.max_age = kwargs['max_job_age']
+            self._jobs.evict()
+
+
+    def gauges(self):
+        gauges = {'jobs': len(self._jobs),
+                  'jobs_running': sum(j.status == 'running' for j in self._jobs),
+                  'jobs_queued': sum(j.status == 'queued' for j in self._jobs)}
+        for name, value in self._renderer.stats().items():
+            if value is not None:
+                gauges[f"render_{name}"] = value
+        for j in self._jobs:
+            if j.status == 'running':
+                gauges[f'job_lines{{job="{j.id}"}}'] = j.lines_in
+                gauges[f'job_bytes{{job="{j.id}"}}'] = j.bytes_in
+        return gauges
+
+    async def on_ready(self):
+        while self._detached:
+            self._tasks.append(asyncio.create_task(self.reattach_job(self._detached.pop(0))))
+        if self._stats_tasks or not stats.enabled: return
+        self._stats_tasks.append(asyncio.create_task(stats.monitor()))
+        if self._stats_file is not None:
+            self._stats_tasks.append(asyncio.create_task(
+                stats.export(self._stats_file, self._stats_interval, self.gauges)))
 
     async def on_raw_reaction_add(self, payload):
-        channel = await self.fetch_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
+        if not stats.enabled:
+            await self._on_reaction(payload)
+            return
+        with stats.timer('reaction_seconds'):
+            await self._on_reaction(payload)
+
+    async def _on_reaction(self, payload):
         member = payload.member
         emoji = payload.emoji
 
         control_emojis = {'close': '🗑️',
-                          'kill': '💀'}
+                          'kill': '💀',
+                          'start': '⏮️',
+                          'up': '⬆️',
+                          'down': '⬇️',
+                          'end': '⏭️'}
 
+        name = emoji.name
+        if name not in control_emojis.values(): return
+        if member is None or payload.user_id == self.user.id: return
+
+        job, view = self._jobs.by_message(payload.message_id)
+        if job is not None:
+            message = view.message
+        elif name == control_emojis['close']:
+            channel = self.get_channel(payload.channel_id) or await self.fetch_channel(payload.channel_id)
+            message = await channel.fetch_message(payload.message_id)
+        else:
+            return
 
         def is_job_control():
-            if member == self.user: return False
             if message.author != self.user: return False
-            if emoji.name not in control_emojis.values(): return False
             if not hasattr(message, 'interaction') or not message.interaction: return False
             appcmd = 2 # discord.InteractionType.application_command
             if message.interaction.type != appcmd: return False
-            return message.interaction.name in ['job run', 'job view']
+            return message.interaction.name in ['job run', 'job sweep', 'job view']
 
-        if not is_job_control():
+        if job is None and not is_job_control():
             return
 
         async def remove_reaction():
-            for reaction in message.reactions:
-                if reaction.emoji not in control_emojis.values(): continue
-                async for user in reaction.users():
-                    if user != self.user:
-                        await reaction.remove(user)
-            return
+            await message.remove_reaction(emoji, member)
 
         if not self.permitted(member):
             await remove_reaction()
             return
 
-        job = self.job_by_view(message)
-        name = emoji.name
-
-        if job is None: 
-            if name == control_emojis['close']:
-                await message.delete()
-
+        if job is None:
+            await message.delete()
             return
 
         if name == control_emojis['close']:
             await job.close_view(message)
         elif name == control_emojis['kill']:
-            await job.kill()
-        await remove_reaction()
+            await self.kill_job(job)
+            await remove_reaction()
+        else:
+            action = next(k for k, v in control_emojis.items() if v == name)
+            job.scroll(view, action)
+            await remove_reaction()
 
     def get_code(self, message):
         pass
@@ -257,5 +663,12 @@ class Shellbot(discord.Bot):
 
     async def close(self):
         await super().close()
-        for job in self._jobs:
-            job.kill()
+        self._renderer.close()
+        for task in self._stats_tasks:
+            task.cancel()
+        await asyncio.gather(*(worker.close() for worker in self._workers.values()))
+        if self._journal is None:
+            # Without a history_dir the jobs could never be reattached.
+            await asyncio.gather(*(job.kill() for job in self._jobs))
+        else:
+            self._journal.close()
@@ -0,0 +1,102 @@
+import os
+import time
+import asyncio
+import collections
+import contextlib
+
+class Timer:
+    def __init__(self, history=1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = collections.deque(maxlen=history)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self._recent.append(value)
+
+    def percentile(self, p):
+        if not self._recent: return 0.0
+        recent = sorted(self._recent)
+        return recent[min(len(recent) - 1, int(p * len(recent)))]
+
+class Stats:
+    def __init__(self):
+        self.enabled = False
+        self.counters = collections.Counter()
+        self.timers = collections.defaultdict(Timer)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def observe(self, name, value):
+        if self.enabled:
+            self.timers[name].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name].observe(time.perf_counter() - start)
+
+    def reset(self):
+        self.counters.clear()
+        self.timers.clear()
+
+    async def monitor(self, interval=1.0):
+        # Event-loop lag: how much later than requested a sleep wakes up.
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.observe('loop_lag_seconds', max(0.0, loop.time() - start - interval))
+
+    def summary(self):
+        lines = []
+        for name in sorted(self.counters):
+            lines.append(f"{name} {self.counters[name]}")
+        for name in sorted(self.timers):
+            t = self.timers[name]
+            lines.append(f"{name} n={t.count} avg={1000 * t.total / max(t.count, 1):.2f}ms "
+                         f"p50={1000 * t.percentile(0.5):.2f}ms p99={1000 * t.percentile(0.99):.2f}ms "
+                         f"max={1000 * t.max:.2f}ms")
+        return lines
+
+    def prometheus(self, gauges=None):
+        lines = []
+        for name in sorted(self.counters):
+            lines.append(f"# TYPE shellbot_{name} counter")
+            lines.append(f"shellbot_{name} {self.counters[name]}")
+        for name in sorted(self.timers):
+            t = self.timers[name]
+            lines.append(f"# TYPE shellbot_{name} summary")
+            for q in [0.5, 0.9, 0.99]:
+                lines.append(f'shellbot_{name}{{quantile="{q}"}} {t.percentile(q)}')
+            lines.append(f"shellbot_{name}_sum {t.total}")
+            lines.append(f"shellbot_{name}_count {t.count}")
+        typed = set()
+        for name, value in sorted((gauges or {}).items()):
+            base = name.split('{')[0]
+            if base not in typed:
+                lines.append(f"# TYPE shellbot_{base} gauge")
+                typed.add(base)
+            lines.append(f"shellbot_{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    async def export(self, path, interval, gauges=None):
+        while True:
+            await asyncio.sleep(interval)
+            temp = path + '.tmp'
+            with open(temp, 'w') as f:
+                f.write(self.prometheus(gauges() if gauges else None))
+            os.replace(temp, path)
+
+stats = Stats()
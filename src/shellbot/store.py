@@ -0,0 +1,177 @@
+import os
+import json
+import array
+
+class Packed:
+    # Lines packed into one UTF-8 buffer with an array of end offsets: the
+    # encoded length plus 8 bytes per line instead of a str and an Event.
+    COMPACT = 1024
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._ends = array.array('Q')
+        self._first = 0
+
+    def __len__(self):
+        return len(self._ends) - self._first
+
+    @property
+    def nbytes(self):
+        return len(self._buffer) - self._begin(self._first) + 8 * len(self)
+
+    def _begin(self, k):
+        return self._ends[k - 1] if k > 0 else 0
+
+    def __getitem__(self, i):
+        k = self._first + i
+        return self._buffer[self._begin(k):self._ends[k]].decode('utf-8', 'surrogatepass')
+
+    def append(self, text):
+        self._buffer += text.encode('utf-8', 'surrogatepass')
+        self._ends.append(len(self._buffer))
+
+    def popleft(self):
+        self._first += 1
+        # Dropped lines are cut off once they are half of the buffer.
+        if self._first >= Packed.COMPACT and 2 * self._first >= len(self._ends):
+            cut = self._ends[self._first - 1]
+            del self._buffer[:cut]
+            self._ends = array.array('Q', (end - cut for end in self._ends[self._first:]))
+            self._first = 0
+
+class MemoryStore:
+    def __init__(self, load):
+        self._load = load
+        self._lines = Packed()
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __getitem__(self, i):
+        n = len(self._lines)
+        if i < 0: i += n
+        if not 0 <= i < n:
+            raise IndexError("event index out of range")
+        return self._load(self._lines[i])
+
+    def append(self, data):
+        self._lines.append(data)
+        return self._load(data)
+
+    def iter(self, start=0):
+        for i in range(start, len(self._lines)):
+            yield self._load(self._lines[i])
+
+    def read(self, start, stop):
+        return (self._load(self._lines[i]) for i in range(start, min(stop, len(self._lines))))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class SpillStore:
+    STRIDE = 64
+
+    def __init__(self, load, path, budget=1 << 20, resume=False):
+        self._load = load
+        self._path = path
+        self._budget = budget
+        self._ring = Packed()
+        self._ring_start = 0
+        self._count = 0
+        self._offset = 0
+        self._index = array.array('Q')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if resume and os.path.exists(path):
+            # Only index the existing events; they are read back on demand.
+            self._file = None
+            self._scan()
+        else:
+            self._file = open(path, 'wb')
+
+    def _scan(self):
+        with open(self._path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'): break
+                if self._count % SpillStore.STRIDE == 0:
+                    self._index.append(self._offset)
+                self._offset += len(line)
+                self._count += 1
+        self._ring_start = self._count
+        if self._offset != os.path.getsize(self._path):
+            os.truncate(self._path, self._offset)
+
+    @property
+    def path(self):
+        return self._path
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if i < 0: i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("event index out of range")
+        if i >= self._ring_start:
+            return self._load(self._ring[i - self._ring_start])
+        return next(self._read(i, i + 1))
+
+    def append(self, data):
+        event = self._load(data)
+        if self._count % SpillStore.STRIDE == 0:
+            self._index.append(self._offset)
+
+        record = (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+        if self._file is None:
+            self._file = open(self._path, 'ab')
+        self._file.write(record)
+        self._offset += len(record)
+        self._count += 1
+
+        self._ring.append(data)
+        while self._ring.nbytes > self._budget and len(self._ring) > 1:
+            self._ring.popleft()
+            self._ring_start += 1
+        return event
+
+    def iter(self, start=0):
+        # Indices are absolute, so events appended or spilled while the
+        # caller is suspended are neither skipped nor repeated.
+        i = start
+        while i < self._count:
+            if i < self._ring_start:
+                for event in self._read(i, self._ring_start):
+                    yield event
+                    i += 1
+            else:
+                yield self._load(self._ring[i - self._ring_start])
+                i += 1
+
+    def read(self, start, stop):
+        # Reads only from the file, never the ring or the write handle, so it
+        # is safe to call from another thread for events below a length
+        # taken, and flushed, beforehand.
+        return self._records(start, min(stop, self._count))
+
+    def _read(self, start, stop):
+        self.flush()
+        return self._records(start, stop)
+
+    def _records(self, start, stop):
+        with open(self._path, 'rb') as f:
+            f.seek(self._index[start // SpillStore.STRIDE])
+            for _ in range(start % SpillStore.STRIDE):
+                f.readline()
+            for _ in range(start, stop):
+                yield self._load(json.loads(f.readline()))
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import signal
+import asyncio
+import subprocess
+
+# Run as a script so that starting a job does not import the bot:
+#   python supervisor.py STATE OUT ARGS...
+# The supervisor starts ARGS with its output appended to OUT, records its
+# own and the child's pid in STATE and, once the child exits, its exit status.
+
+def _write(path, state):
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp, path)
+
+def main(argv):
+    state_path, out_path, *args = argv[1:]
+    state = {'pid': os.getpid()}
+    try:
+        with open(out_path, 'ab') as out:
+            ps = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=out, stderr=subprocess.STDOUT)
+    except OSError as e:
+        state['error'] = str(e)
+        _write(state_path, state)
+        return
+
+    signal.signal(signal.SIGTERM, lambda *_: ps.terminate())
+    signal.signal(signal.SIGINT, lambda *_: ps.send_signal(signal.SIGINT))
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    state['child'] = ps.pid
+    _write(state_path, state)
+    state['returncode'] = ps.wait()
+    _write(state_path, state)
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class Tail:
+    def __init__(self, path, done, offset=0):
+        self._path = path
+        self._done = done
+        self._file = None
+        self.offset = offset
+
+    async def read(self, n):
+        delay = Supervised.POLL
+        while True:
+            if self._file is None and os.path.exists(self._path):
+                self._file = open(self._path, 'rb')
+                self._file.seek(self.offset)
+            if self._file is not None:
+                data = self._file.read(n)
+                if data:
+                    self.offset += len(data)
+                    return data
+            # Everything the child wrote is in the file once it has exited.
+            if self._done():
+                data = self._file.read(n) if self._file is not None else b''
+                self.offset += len(data)
+                if not data: self.close()
+                return data
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, Supervised.MAX_POLL)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class Supervised:
+    POLL = 0.05
+    MAX_POLL = 0.5
+    SCRIPT = ("import runpy, sys; sys.argv = sys.argv[1:]; "
+              "runpy.run_path(sys.argv[0], run_name='__main__')")
+
+    def __init__(self, out, state, offset=0):
+        self._out = out
+        self._state_path = state
+        self._stamp = None
+        self._state = {}
+        self._reload()
+        self.stdout = Tail(out, self._finished, offset)
+
+    @classmethod
+    async def start(cls, args, out, state):
+        if os.path.exists(state):
+            os.remove(state)
+        offset = os.path.getsize(out) if os.path.exists(out) else 0
+        ps = await asyncio.create_subprocess_exec(sys.executable, '-c', Supervised.SCRIPT,
+                                                  __file__, state, out, *args,
+                                                  stdin=asyncio.subprocess.DEVNULL,
+                                                  stdout=asyncio.subprocess.DEVNULL,
+                                                  stderr=asyncio.subprocess.DEVNULL,
+                                                  start_new_session=True)
+        while not os.path.exists(state):
+            if ps.returncode is not None:
+                raise OSError(f"Supervisor exited with status {ps.returncode}.")
+            await asyncio.sleep(Supervised.POLL)
+
+        self = cls(out, state, offset)
+        if 'error' in self._state:
+            raise OSError(self._state['error'])
+        return self
+
+    @property
+    def pid(self):
+        return self._state.get('child')
+
+    @property
+    def returncode(self):
+        return self._state.get('returncode')
+
+    def _reload(self, force=False):
+        # The state file is replaced on every write, so it is only parsed
+        # again when its inode or mtime changed.
+        try:
+            st = os.stat(self._state_path)
+        except FileNotFoundError:
+            return
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if force or stamp != self._stamp:
+            self._stamp = stamp
+            self._state = _read(self._state_path) or self._state
+
+    def _finished(self):
+        if self.returncode is not None: return True
+        self._reload()
+        if self.returncode is not None: return True
+        if 'pid' in self._state and not _alive(self._state['pid']):
+            # Killed before it could record the child's exit status.
+            self._reload(force=True)
+            if self.returncode is None:
+                self._state['returncode'] = -signal.SIGKILL
+            return True
+        return False
+
+    async def wait(self):
+        delay = Supervised.POLL
+        while not self._finished():
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, Supervised.MAX_POLL)
+        return self.returncode
+
+    def terminate(self):
+        os.kill(self._state['pid'], signal.SIGTERM)
+
+    def kill(self):
+        try:
+            os.killpg(self._state['pid'], signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,195 @@
+import asyncio
+import collections
+import functools
+import itertools
+from shellbot.job import Job, STATUS_PREFIXES
+from shellbot.window import Window
+from shellbot.render import Renderer
+
+MAX_CHILDREN = 256
+
+def expand(grid):
+    # 'lr=0.1,0.01 seed=1,2' -> every combination as a dict of strings.
+    names, values = [], []
+    for item in grid.split():
+        name, eq, text = item.partition('=')
+        if not eq or not name or not text:
+            raise ValueError(f"Expected name=value,... in the grid, got {item}.")
+        if name in names:
+            raise ValueError(f"Parameter {name} appears twice in the grid.")
+        names.append(name)
+        values.append(text.split(','))
+    if not names:
+        raise ValueError("The grid is empty.")
+    count = 1
+    for v in values:
+        count *= len(v)
+    if count > MAX_CHILDREN:
+        raise ValueError(f"The grid has {count} combinations, at most {MAX_CHILDREN} are allowed.")
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+def instantiate(template, params):
+    # Substituted per argument, so a value never splits into several.
+    try:
+        return [arg.format(**params) for arg in template.split(' ')]
+    except KeyError as e:
+        raise ValueError(f"Parameter {e.args[0]} is not in the grid.")
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"Invalid command template: {e}")
+
+class SweepWindow(Window):
+    # One status line per child instead of output.
+    MAX_CHARS = 1800
+    RANK = {'running': 0, 'fail': 1, 'queued': 2, 'success': 3}
+
+    def __init__(self, sweep, renderer=None, listener=None):
+        super().__init__(sweep.id, None, renderer, listener)
+        self._sweep = sweep
+
+    def _line(self, params, job, width=None):
+        prefix = STATUS_PREFIXES.get(job.status, '').ljust(3)
+        line = prefix + str(job.id) + ' :: ' + ' '.join(f"{k}={v}" for k, v in params.items())
+        line += f" :: {job.status}"
+        last = job.last()
+        if last: line += f" :: {last}"
+        return line if width is None else line[:width]
+
+    def _summary(self):
+        counts = collections.Counter(job.status for _, job in self._sweep.children)
+        return ', '.join(f"{counts[s]} {s}" for s in SweepWindow.RANK if counts[s])
+
+    def _trailer(self):
+        if not self._closed: return None
+        return f"--- SWEEP {self._sweep.status.upper()}"
+
+    def dump(self):
+        yield f"--- JOB ID {self._job_id} :: {' '.join(self._sweep.args)} :: {self._summary()}\n\n"
+        for params, job in self._sweep.children:
+            yield self._line(params, job) + '\n'
+        trailer = self._trailer()
+        if trailer: yield '\n' + trailer
+
+    def _build(self, raw=False):
+        if raw: return ''.join(self.dump())
+        children = sorted(self._sweep.children, key=lambda c: SweepWindow.RANK.get(c[1].status, 2))
+        buff = "```diff\n"
+        buff += f"--- JOB ID {self._job_id} :: {self._summary()}\n\n"
+        size = 0
+        for i, (params, job) in enumerate(children):
+            line = self._line(params, job, self.line_width)
+            if size + len(line) > SweepWindow.MAX_CHARS:
+                buff += f"... and {len(children) - i} more\n"
+                break
+            buff += line + '\n'
+            size += len(line) + 1
+        trailer = self._trailer()
+        if trailer: buff += '\n' + trailer
+        buff += "```"
+        return buff
+
+    def search(self, regex, pattern=None, context=0):
+        return lambda: ([], False)
+
+    def scroll(self, view, action):
+        # A single page: scrolling only refreshes it.
+        view.offset = None
+        if self._renderer is not None:
+            self._renderer.submit(self, view, self._build())
+
+    def refresh(self):
+        self._mark()
+
+class Sweep:
+    REFRESH = 1.0
+
+    def __init__(self, template, renderer=None, registry=None, limit=None, host=None):
+        self.args = template.split(' ')
+        self.host = host
+        self.id = Job.id_counter
+        Job.id_counter += 1
+        self.children = []
+        self.usage = None
+        self.returncode = None
+        self.status = None
+        self._limit = limit
+        self._registry = registry
+        self._stopped = False
+        self._window = SweepWindow(self,
+                                   Renderer() if renderer is None else renderer,
+                                   functools.partial(registry.track, self) if registry is not None else None)
+
+    @property
+    def lines_in(self):
+        return sum(job.lines_in for _, job in self.children)
+
+    @property
+    def bytes_in(self):
+        return sum(job.bytes_in for _, job in self.children)
+
+    def add(self, params, job):
+        job.status = 'queued'
+        self.children.append((params, job))
+
+    @property
+    def views(self):
+        return self._window.views
+
+    async def view(self, ctx):
+        await self._window.view(ctx)
+
+    async def close_view(self, message):
+        await self._window.close_view(message)
+
+    def last(self):
+        return self._window._summary()
+
+    def scroll(self, view, action):
+        self._window.scroll(view, action)
+
+    async def search(self, regex, pattern=None, context=0):
+        return [], False
+
+    def output(self):
+        return None
+
+    def dump(self):
+        return self._window.dump()
+
+    async def _refresh(self):
+        # Children render into their own windows; the status lines follow.
+        while True:
+            await asyncio.sleep(Sweep.REFRESH)
+            self._window.refresh()
+
+    async def _child(self, semaphore, schedule, job):
+        async with semaphore:
+            if self._stopped:
+                job.cancel()
+                if self._registry is not None:
+                    self._registry.finish(job)
+                return
+            await schedule(job)
+        self._window.refresh()
+
+    async def run(self, schedule):
+        self.status = 'running'
+        semaphore = asyncio.Semaphore(self._limit or len(self.children) or 1)
+        refresh = asyncio.create_task(self._refresh())
+        try:
+            await asyncio.gather(*(self._child(semaphore, schedule, job) for _, job in self.children))
+        finally:
+            refresh.cancel()
+            ok = all(job.status == 'success' for _, job in self.children)
+            self.returncode = 0 if ok else 1
+            self.status = 'success' if ok else 'fail'
+            self._window.close()
+
+    def stop(self):
+        self._stopped = True
+
+    def cancel(self, reason=None):
+        self.stop()
+
+    async def kill(self):
+        # The children are jobs of their own and are killed with them.
+        self.stop()
@@ -0,0 +1,46 @@
+import re
+
+CONTROL = re.compile('[\r\x08\x1b]')
+TOKENS = re.compile(r'\x1b\[([0-9;?]*)([@-~])|\x1b[@-Z\\-_]?|\r|\x08|[^\r\x08\x1b]+')
+
+def collapse(text):
+    # What a terminal would show for one line: carriage returns and
+    # backspaces move the cursor and later text overwrites earlier text.
+    # Erase-in-line and horizontal cursor movement are applied; other
+    # escape sequences (colours, cursor up/down, ...) are dropped.
+    if not CONTROL.search(text): return text
+    chars = []
+    cursor = 0
+    for match in TOKENS.finditer(text):
+        token = match.group(0)
+        final = match.group(2)
+        if token == '\r':
+            cursor = 0
+        elif token == '\b':
+            cursor = max(0, cursor - 1)
+        elif final is not None:
+            params = match.group(1)
+            n = int(params) if params.isdigit() else 0
+            if final == 'K':
+                if n == 0: del chars[cursor:]
+                elif n == 1: chars[:cursor] = ' ' * min(cursor, len(chars))
+                elif n == 2: chars = []
+            elif final == 'C':
+                cursor += max(n, 1)
+            elif final == 'D':
+                cursor = max(0, cursor - max(n, 1))
+            elif final == 'G':
+                cursor = max(0, n - 1)
+        elif not token.startswith('\x1b'):
+            if cursor > len(chars):
+                chars.extend(' ' * (cursor - len(chars)))
+            chars[cursor:cursor + len(token)] = token
+            cursor += len(token)
+    return ''.join(chars)
+
+def compact(buff):
+    # Collapses an unfinished line up to its last carriage return, so a
+    # progress bar that keeps redrawing it uses constant memory.
+    p = buff.rfind(b'\r')
+    if p <= 0: return buff
+    return collapse(buff[:p].decode('utf-8', 'replace')).encode('utf-8') + buff[p:]
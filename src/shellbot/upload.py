@@ -0,0 +1,172 @@
+import os, io
+import json
+import hashlib
+import asyncio
+import functools
+import contextlib
+import tempfile
+import zipfile
+import gzip, bz2, lzma
+
+SPOOL_SIZE = 8 << 20
+CHUNK_SIZE = 1 << 20
+MAX_ATTACHMENTS = 10
+
+COMPRESSIONS = {
+    'none': (None, ''),
+    'gzip': (gzip.GzipFile, '.gz'),
+    'bz2': (bz2.BZ2File, '.bz2'),
+    'xz': (lzma.LZMAFile, '.xz'),
+}
+
+class TooLarge(ValueError):
+    def __init__(self, limit, parts=None):
+        if parts is None:
+            super().__init__(f"The file exceeds the upload limit of {limit / (1 << 20):g} MiB.")
+        else:
+            super().__init__(f"The file exceeds the limit of {parts} parts of {limit / (1 << 20):g} MiB.")
+
+@contextlib.contextmanager
+def spool():
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        yield f
+    finally:
+        f.close()
+
+def suffix(compression):
+    return COMPRESSIONS[compression][1]
+
+def _check(f, limit):
+    if limit is not None and f.tell() > limit:
+        raise TooLarge(limit)
+
+@contextlib.contextmanager
+def _compressor(f, compression):
+    cls = COMPRESSIONS[compression][0]
+    if cls is None:
+        yield f
+        return
+    out = cls(fileobj=f, mode='wb') if cls is gzip.GzipFile else cls(f, mode='wb')
+    try:
+        yield out
+    finally:
+        out.close()
+
+def _write_zip(f, path, limit):
+    with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                zf.write(full, os.path.relpath(full, path))
+                _check(f, limit)
+    _check(f, limit)
+
+def _write_file(f, path, compression, limit):
+    with open(path, 'rb') as src, _compressor(f, compression) as out:
+        while True:
+            data = src.read(CHUNK_SIZE)
+            if not data: break
+            out.write(data)
+            _check(f, limit)
+    _check(f, limit)
+
+async def write_path(f, path, compression='none', limit=None):
+    if os.path.isdir(path):
+        func = functools.partial(_write_zip, f, path, limit)
+    else:
+        func = functools.partial(_write_file, f, path, compression, limit)
+    await asyncio.get_running_loop().run_in_executor(None, func)
+    f.seek(0)
+
+async def write_text(f, chunks, compression='none', limit=None, batch=4096):
+    with _compressor(f, compression) as out:
+        for i, chunk in enumerate(chunks):
+            out.write(chunk.encode('utf-8'))
+            if i % batch == batch - 1:
+                _check(f, limit)
+                await asyncio.sleep(0)
+    _check(f, limit)
+    f.seek(0)
+
+class Section(io.RawIOBase):
+    def __init__(self, f, start, size):
+        self._f = f
+        self._start = start
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._size}[whence]
+        self._pos = max(0, min(self._size, base + offset))
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), self._size - self._pos)
+        if n <= 0: return 0
+        self._f.seek(self._start + self._pos)
+        data = self._f.read(n)
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+def _split(f, name, limit):
+    f.seek(0, io.SEEK_END)
+    total = f.tell()
+    count = -(-total // limit)
+    width = len(str(count))
+
+    digest = hashlib.sha256()
+    files = []
+    manifest = {'name': name, 'size': total, 'parts': []}
+    for i in range(count):
+        start = i * limit
+        size = min(limit, total - start)
+        part = hashlib.sha256()
+        f.seek(start)
+        remaining = size
+        while remaining:
+            data = f.read(min(CHUNK_SIZE, remaining))
+            digest.update(data)
+            part.update(data)
+            remaining -= len(data)
+
+        part_name = f"{name}.part{i + 1:0{width}d}"
+        files.append((part_name, Section(f, start, size), size))
+        manifest['parts'].append({'name': part_name,
+                                  'size': size,
+                                  'sha256': part.hexdigest()})
+
+    manifest['sha256'] = digest.hexdigest()
+    data = json.dumps(manifest, indent=2).encode('utf-8')
+    files.append((f"{name}.manifest.json", io.BytesIO(data), len(data)))
+    return files
+
+async def split(f, name, limit):
+    f.seek(0, io.SEEK_END)
+    if f.tell() <= limit:
+        f.seek(0)
+        return [[(name, f)]]
+
+    func = functools.partial(_split, f, name, limit)
+    files = await asyncio.get_running_loop().run_in_executor(None, func)
+
+    batches, batch, used = [], [], 0
+    for part_name, fp, size in files:
+        if batch and (used + size > limit or len(batch) == MAX_ATTACHMENTS):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append((part_name, fp))
+        used += size
+    batches.append(batch)
+    return batches
@@ -0,0 +1,106 @@
+import os
+import time
+import collections
+
+TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def human(n):
+    for unit in ['B', 'K', 'M', 'G']:
+        if abs(n) < 1024: break
+        n /= 1024
+    else:
+        unit = 'T'
+    return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+
+def clock(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def _stat(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        data = f.read()
+    # The command name may contain spaces and parentheses.
+    fields = data[data.rindex(')') + 2:].split()
+    cpu = sum(int(fields[i]) for i in range(11, 15)) / TICKS
+    rss = int(fields[21]) * PAGE_SIZE
+    return cpu, rss
+
+def _io(pid):
+    read = write = 0
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key == 'read_bytes': read = int(value)
+                elif key == 'write_bytes': write = int(value)
+    except (PermissionError, FileNotFoundError, ProcessLookupError):
+        pass
+    return read, write
+
+def _children(pid):
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(map(int, f.read().split()))
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return children
+
+class Usage:
+    def __init__(self, pid, history=360):
+        self.pid = pid
+        self.start = time.monotonic()
+        self.samples = collections.deque(maxlen=history)
+        self.peak_rss = 0
+        self.finished = None
+
+    def sample(self):
+        cpu = rss = read = write = 0
+        found = False
+        pending = [self.pid]
+        while pending:
+            pid = pending.pop()
+            try:
+                cpu1, rss1 = _stat(pid)
+            except (FileNotFoundError, ProcessLookupError):
+                continue
+            found = True
+            read1, write1 = _io(pid)
+            cpu += cpu1
+            rss += rss1
+            read += read1
+            write += write1
+            pending.extend(_children(pid))
+
+        if not found: return None
+        sample = (time.monotonic() - self.start, cpu, rss, read, write)
+        self.samples.append(sample)
+        self.peak_rss = max(self.peak_rss, rss)
+        return sample
+
+    def cpu_percent(self):
+        if len(self.samples) < 2:
+            if not self.samples or not self.samples[-1][0]: return 0
+            return 100 * self.samples[-1][1] / self.samples[-1][0]
+        (t0, cpu0, *_), (t1, cpu1, *_) = self.samples[-2], self.samples[-1]
+        return 100 * max(0, cpu1 - cpu0) / max(t1 - t0, 1e-9)
+
+    def finish(self):
+        self.finished = time.monotonic() - self.start
+
+    def summary(self, elapsed=True):
+        # The window header leaves out the running clock, so that an idle
+        # job's header stays the same and costs no edits.
+        wall = self.finished if self.finished is not None else time.monotonic() - self.start
+        if not self.samples:
+            return f"wall {clock(wall)}" if elapsed or self.finished is not None else None
+        _, cpu, rss, read, write = self.samples[-1]
+        if self.finished is None:
+            return (f"cpu {self.cpu_percent():.0f}% | rss {human(rss)} | "
+                    f"read {human(read)} | write {human(write)}" + (f" | {clock(wall)}" if elapsed else ""))
+        return (f"avg cpu {100 * cpu / max(wall, 1e-9):.0f}% | peak rss {human(self.peak_rss)} | "
+                f"read {human(read)} | write {human(write)} | wall {clock(wall)}")
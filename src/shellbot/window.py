@@ -1,189 +1,506 @@
 import time
+import hashlib
+import itertools
+import collections
 import discord
+from shellbot.store import MemoryStore
+from shellbot.search import Trigrams, grep, literal
+from shellbot import series
+from shellbot.stats import stats
 
 class Event:
-    def __init__(self, data):
-        if data.startswith('[[LOG]]'):
-            self.type = 'LOG'
-            self.misc, self.text = Event.parseLog(data)
-
-        elif data.startswith('[[SUC]]'):
-            self.type = 'SUC'
-            self.misc = {}
-            self.text = data[7:]
+    __slots__ = ('data', 'type', '_misc', '_text')
 
-        elif data.startswith('[[ERR]]'):
-            self.type = 'ERR'
-            self.misc = {}
-            self.text = data[7:]
+    TAGS = {'[[LOG]]': 'LOG',
+            '[[SUC]]': 'SUC',
+            '[[ERR]]': 'ERR'}
+    EMPTY = {}
 
+    def __init__(self, data):
+        self.data = data
+        self.type = Event.TAGS.get(data[:7]) if data.startswith('[[') else None
+        self._misc = None
+        self._text = None
+
+    @property
+    def text(self):
+        if self.type is None: return self.data
+        if self._text is None: self._parse()
+        return self._text
+
+    @property
+    def misc(self):
+        if self.type is None: return None
+        if self._misc is None: self._parse()
+        return self._misc
+
+    def _parse(self):
+        if self.type == 'LOG':
+            self._misc, self._text = Event.parseLog(self.data)
         else:
-            self.type = None
-            self.misc = None
-            self.text = data
+            self._misc, self._text = Event.EMPTY, self.data[7:]
 
     @classmethod
     def parseLog(cls, data):
         data = data[7:].lstrip()
-        if data[0] != '[': return {}, data
+        if not data.startswith('[') or ']' not in data: return {}, data
         inside = data[1:].split(']')[0]
         outside = data[len(inside) + 2:].strip()
-        if '[' in inside or ']' in inside: return {}, outside
-        assignments = inside.split(',')
-        misc = dict([(a.split('=')[0].strip(), a.split('=')[1].strip()) 
-                     for a in assignments])
+        if '[' in inside: return {}, outside
+        misc = {}
+        for a in inside.split(','):
+            key, eq, value = a.partition('=')
+            if eq: misc[key.strip()] = value.strip()
         misc['ellipsis'] = misc.get('ellipsis', 'false').lower() == 'true'
         return misc, outside
 
 class View:
+    CONTROLS = ['🗑️', '💀']
+    # Each reaction is a rate limited REST call, so these are only added
+    # once there is anything to scroll to.
+    SCROLL = ['⏮️', '⬆️', '⬇️', '⏭️']
+
     def __init__(self, ctx):
         self._ctx = ctx
         self._interaction = None
         self._message = None
+        self._digest = None
         self.closed = False
+        # Index of the first event shown, or None to follow the output.
+        self.offset = None
+        self.shown = 0
+        self.scrollable = False
+
+    @property
+    def channel_id(self):
+        return self._ctx.channel_id
+
+    @property
+    def message(self):
+        return self._message
+
+    @property
+    def message_id(self):
+        return self._message.id if self._message else None
 
     def tied_to(self, message):
         return message.id == self._message.id
 
     async def close(self):
+        self.closed = True
         await self._message.delete()
 
-    async def render(self, content):
+    @staticmethod
+    def _hash(content):
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+    def shows(self, content):
+        return self._digest is not None and self._digest == View._hash(content)
+
+    async def _add_scroll(self):
+        self.scrollable = True
+        for emoji in View.SCROLL:
+            try:
+                await self._message.add_reaction(emoji)
+            except discord.HTTPException:
+                return
+
+    async def render(self, content, scrollable=False):
+        digest = View._hash(content)
+        if digest == self._digest:
+            stats.count('view_edits_skipped')
+            return False
+
         if not self._interaction:
-            self._interaction = await self._ctx.respond(Window.BLANK)
+            self._interaction = await self._ctx.respond(content)
+            self._digest = digest
             message = await self._interaction.original_response()
             self._message = message
-            await message.add_reaction('🗑️')
-            await message.add_reaction('💀')
+            for emoji in View.CONTROLS:
+                await message.add_reaction(emoji)
+            if scrollable:
+                await self._add_scroll()
+            return True
 
+        start = time.perf_counter()
         try:
             await self._interaction.edit_original_response(content=content)
         except:
+            stats.count('view_edit_failures')
             self.closed = True
+            return False
+        finally:
+            if stats.enabled:
+                stats.observe('view_edit_seconds', time.perf_counter() - start)
+
+        self._digest = digest
+        stats.count('view_edits')
+        if scrollable and not self.scrollable:
+            await self._add_scroll()
+        return True
 
 class Window:
     BLANK = '‎ '
+    MAX_SERIES = 16
 
-    def __init__(self, job_id):
+    def __init__(self, job_id, store=None, renderer=None, listener=None, index=False):
         self._job_id = job_id
-        self._events = []
-        self._update = True
+        self._index = Trigrams() if index else None
+        self._renderer = renderer
+        self._listener = listener
+        self._events = MemoryStore(Event) if store is None else store
         self.min_height = 5
         self.max_height = 20
         self._exit_status = None
+        self._status = None
+        self._first_shown = None
         self._closed = False
         self._views = []
+        self.line_width = 80
+        self._last_typed = None
+        self._partial = None
+        self._series = {}
+        self._tail_height = None
 
-    def has_view(self, message):
-        for view in self._views:
-            if view.tied_to(message):
-                return True
-        return False
+    @property
+    def views(self):
+        return list(self._views)
+
+    def drop_view(self, view):
+        if view in self._views:
+            self._views.remove(view)
+            if self._listener: self._listener(view, False)
 
     async def view(self, ctx):
         view = View(ctx)
-        await view.render(self._build())
+        await view.render(self._build(), self.scrollable)
         self._views.append(view)
+        if self._listener: self._listener(view, True)
 
     async def close_view(self, message):
-        for i in range(len(self._views)):
-            if self._views[i].tied_to(message):
-                await self._views.pop(i).close()
+        for view in self._views:
+            if view.tied_to(message):
+                self.drop_view(view)
+                await view.close()
                 return
 
-    def _build(self, raw=False):
-        line_width = 80
-        buff = "" if raw else "```diff\n"
+    def _lines(self, curr, ante, post, status, last, width):
+        prefix = ""
+        text = curr.text
 
-        status = None
+        if curr.type == 'LOG' and curr.misc.get('ellipsis', False):
+            if last:
+                text += '...'
+            if status == 'ERR':
+                prefix = '-  '
+            elif status == 'SUC':
+                prefix = '+  '
+            elif last:
+                prefix = '>  '
+            else:
+                prefix = '*  '
+            status = None
+
+        elif curr.type == 'LOG':
+            prefix = '>  ' if last else '*  '
+            status = None
+
+        elif curr.type == 'ERR':
+            prefix = '-  '
+            status = curr.type
+
+        elif curr.type == 'SUC':
+            prefix = '+  '
+            status = curr.type
+
+        else:
+            prefix = " "
+            if ante is not None and ante.type is not None:
+                text = f'{Window.BLANK}\n' * 1 + text
+            if post is not None and post.type is not None:
+                text = text + f'{Window.BLANK}\n' * 2
 
         lines = []
+        for text1 in text.splitlines():
+            step = len(text1) if width is None else width - len(prefix)
+            for begin in range(0, len(text1), step or 1):
+                lines.append(prefix + text1[begin : begin + step])
+        return lines, status
+
+    def _walk(self, lo, width):
+        # Status (SUC/ERR after an ellipsis) propagates backwards,
+        # so events are always visited from the last one down to lo.
+        status = None
+        n = len(self._events)
+        curr, post = (self._events[n - 1] if n > lo else None), None
+        for i in reversed(range(lo, n)):
+            ante = self._events[i - 1] if i > 0 else None
+            lines, status = self._lines(curr, ante, post, status, i == n - 1, width)
+            yield lines
+            curr, post = ante, curr
+
+    def _stream(self):
+        # Forward counterpart of _walk for raw output. The status of an
+        # ellipsis is resolved by looking ahead to the next typed event,
+        # so every event is read at most twice and nothing is buffered.
+        n = len(self._events)
+        events = self._events.iter(0)
+        ante, curr = None, next(events, None)
+        for i in range(n):
+            post = next(events, None) if i < n - 1 else None
+            status = None
+            if curr.type == 'LOG' and curr.misc.get('ellipsis', False):
+                for ahead in self._events.iter(i + 1):
+                    if ahead.type is not None:
+                        status = ahead.type
+                        break
+            lines, _ = self._lines(curr, ante, post, status, i == n - 1, None)
+            yield from lines
+            ante, curr = curr, post
+
+    def _series_lines(self):
+        lines = []
+        for s in self._series.values():
+            prefix = '+  ' if s.finished() else '>  ' if s.kind == 'progress' else '   '
+            lines.append(prefix + s.render())
+        return lines
+
+    def dump(self):
+        yield f"--- JOB ID {self._job_id}\n\n"
+        first = True
+        for line in itertools.chain(self._stream(), self._series_lines()):
+            yield line if first else '\n' + line
+            first = False
+
         if self._closed:
             if self._exit_status is not None:
-                lines.append(f"\n--- EXIT STATUS {self._exit_status}")
+                trailer = f"\n--- EXIT STATUS {self._exit_status}"
             else:
-                lines.append(f"\n--- END")
-
-        for i in reversed(range(len(self._events))):
-            ante = self._events[i - 1] if i > 0 else None
-            post = self._events[i + 1] if i < len(self._events) - 1 else None
-            curr = self._events[i]
-            prefix = ""
-            text = curr.text
+                trailer = f"\n--- END"
+            yield trailer if first else '\n' + trailer
+
+    def search(self, regex, pattern=None, context=0):
+        # Returns a callable to run off the event loop. Only the events that
+        # exist now are searched; the index narrows a literal pattern down
+        # to the blocks that can contain it.
+        n = len(self._events)
+        self._events.flush()
+        blocks = None
+        if self._index is not None and self._index.count == n and pattern is not None:
+            text = literal(pattern)
+            if text is not None:
+                blocks = self._index.candidates(text)
+        return lambda: grep(self._events.read, n, regex, context, blocks)
+
+    def _page(self, offset):
+        # Random access into the store: at most a couple of pages of
+        # events are read, however long the output is.
+        n = len(self._events)
+        lo = max(0, offset - 1)
+        self._events.flush()
+        events = list(self._events.read(lo, min(n, offset + 2 * self.max_height + 1)))
+        lines = []
+        shown = 0
+        for k in range(offset - lo, len(events)):
+            curr = events[k]
+            ante = events[k - 1] if k > 0 else None
+            post = events[k + 1] if k + 1 < len(events) else None
+            status = None
+            if curr.type == 'LOG' and curr.misc.get('ellipsis', False):
+                status = next((e.type for e in events[k + 1:] if e.type is not None), None)
+            lines1, _ = self._lines(curr, ante, post, status, lo + k == n - 1, self.line_width)
+            if shown and len(lines) + len(lines1) > self.max_height: break
+            lines += lines1
+            shown += 1
+
+        buff = "```diff\n"
+        buff += f"--- JOB ID {self._job_id} :: lines {offset + 1}-{offset + shown} of {n}\n\n"
+        buff += '\n'.join(lines[:self.max_height])
+        buff += "```"
+        return buff, shown
+
+    def scroll(self, view, action):
+        n = len(self._events)
+        if self._first_shown is None: self._build()
+        top = view.offset
+        if top is None: top = self._first_shown
+        if action == 'start':
+            offset = 0
+        elif action == 'up':
+            offset = self._above(top)
+        elif action == 'down':
+            offset = top + max(view.shown, 1) if view.offset is not None else None
+        else:
+            offset = None
+        if offset is not None and action != 'up' and offset >= self._first_shown:
+            offset = None
 
+        view.offset = offset
+        if offset is None:
+            content = self._build()
+        else:
+            content, view.shown = self._page(offset)
+        if self._renderer is not None:
+            self._renderer.submit(self, view, content)
+
+    def _above(self, top):
+        # The offset of the page that ends right above the event at top.
+        n = len(self._events)
+        lo = max(0, top - self.max_height - 1)
+        self._events.flush()
+        events = list(self._events.read(lo, min(n, top + 1)))
+        offset = top
+        count = 0
+        for k in range(top - lo - 1, -1, -1):
+            curr = events[k]
+            ante = events[k - 1] if k > 0 else None
+            post = events[k + 1] if k + 1 < len(events) else None
+            status = None
             if curr.type == 'LOG' and curr.misc.get('ellipsis', False):
-                if i == len(self._events) - 1:
-                    text += '...'
-                if status == 'ERR':
-                    prefix = '-  '
-                elif status == 'SUC':
-                    prefix = '+  '
-                elif i == len(self._events) - 1:
-                    prefix = '>  '
-                else:
-                    prefix = '*  '
-                status = None
-
-            elif curr.type == 'LOG':
-                prefix = '>  ' if i == len(self._events) - 1 else '*  '
-                status = None
-
-            elif curr.type == 'ERR':
-                prefix = '-  '
-                status = curr.type
+                status = next((e.type for e in events[k + 1:] if e.type is not None), None)
+            lines, _ = self._lines(curr, ante, post, status, lo + k == n - 1, self.line_width)
+            if offset < top and count + len(lines) > self.max_height: break
+            count += len(lines)
+            offset = lo + k
+        return offset
+
+    def _refresh_tail(self):
+        n = len(self._events)
+        if self._tail_height != self.max_height:
+            self._tail = collections.deque()
+            self._tail_start = 0
+            self._tail_lines = 0
+            self._tail_typed = None
+            self._tail_height = self.max_height
+
+        end = self._tail_start + len(self._tail)
+        if end == n: return
+
+        # Besides the new events, only the previous last event (ellipsis,
+        # prefix, trailing padding) and the previous last typed event
+        # (SUC/ERR status) can render differently.
+        lo = max(end - 1, self._tail_start)
+        if self._tail_typed is not None and self._tail_typed >= self._tail_start:
+            lo = min(lo, self._tail_typed)
+
+        fresh = []
+        count = 0
+        i = n
+        for lines in self._walk(lo, self.line_width):
+            i -= 1
+            fresh.append(lines)
+            count += len(lines)
+            # Only the last event can still shrink (loses its '...'),
+            # so it does not count towards the height.
+            if count - len(fresh[0]) >= self.max_height: break
+
+        if i > lo:
+            self._tail.clear()
+            self._tail_start = i
+            self._tail_lines = 0
+        while self._tail_start + len(self._tail) > i:
+            self._tail_lines -= len(self._tail.pop())
+        for lines in reversed(fresh):
+            self._tail.append(lines)
+            self._tail_lines += len(lines)
+
+        while (len(self._tail) > 2 and self._tail_lines - len(self._tail[0])
+               - len(self._tail[-1]) >= self.max_height):
+            self._tail_lines -= len(self._tail.popleft())
+            self._tail_start += 1
+
+        self._tail_typed = self._last_typed
 
-            elif curr.type == 'SUC':
-                prefix = '+  '
-                status = curr.type
+    def _build(self, raw=False):
+        if raw: return ''.join(self.dump())
+        start = time.perf_counter() if stats.enabled else None
+        buff = "```diff\n"
 
+        lines = []
+        if self._closed:
+            if self._exit_status is not None:
+                lines.append(f"\n--- EXIT STATUS {self._exit_status}")
             else:
-                prefix = " "
-                if ante is not None and ante.type is not None:
-                    text = f'{Window.BLANK}\n' * 1 + text
-                if post is not None and post.type is not None:
-                    text = text + f'{Window.BLANK}\n' * 2
-
-            text_width = line_width - len(prefix)
-            for text1 in reversed(text.splitlines()):
-                text_width2 = len(text) + 100 if raw else text_width
-                for begin in reversed(range(0, len(text1), text_width2)):
-                    chunk = text1[begin : begin + text_width2]
-                    chunk = prefix + chunk
-                    lines.append(chunk)
-
-            if not raw and len(lines) >= self.max_height:
-                break
-
-        buff += f"--- JOB ID {self._job_id}\n\n"
-        buff += '\n'.join(reversed(
-            lines if raw else lines[:self.max_height]
-            ))
-        if not raw: buff += "```"
+                lines.append(f"\n--- END")
+        lines.extend(reversed(self._series_lines()))
+        if not self._closed and self._partial:
+            lines.extend(reversed(self._lines(Event(self._partial), None, None, None, True, self.line_width)[0]))
+
+        self._refresh_tail()
+        first = self._tail_start + len(self._tail)
+        for lines1 in reversed(self._tail):
+            if len(lines) >= self.max_height: break
+            lines.extend(reversed(lines1))
+            first -= 1
+        # Scrolling up continues above the first event shown in full.
+        self._first_shown = first + 1 if len(lines) > self.max_height else first
+
+        buff += f"--- JOB ID {self._job_id}"
+        if self._status: buff += f" :: {self._status}"
+        buff += "\n\n"
+        buff += '\n'.join(reversed(lines[:self.max_height]))
+        buff += "```"
+        if start is not None:
+            stats.observe('window_build_seconds', time.perf_counter() - start)
+            stats.count('window_build_lines', min(len(lines), self.max_height))
         return buff
 
-    async def render(self):
-        closed = self._closed
-        if not self._update: return not closed
-
-        content = self._build()
-        i = 0
-        while i < len(self._views):
-            view = self._views[i]
-            await view.render(content)
-            if view.closed:
-                self._views.pop(i)
-            else:
-                i += 1
+    def last(self):
+        # One line summing up the latest output.
+        if self._partial: return self._partial
+        for s in reversed(self._series.values()):
+            return s.render()
+        n = len(self._events)
+        return self._events[n - 1].text if n else ''
+
+    @property
+    def scrollable(self):
+        return len(self._events) > self.max_height
+
+    def _mark(self):
+        if self._renderer is not None:
+            self._renderer.mark(self)
 
-        self._update = False
-        return not closed
+    def set_status(self, status):
+        if status == self._status: return
+        self._status = status
+        self._mark()
 
     def close(self, exit_status=None):
         self._exit_status = exit_status
         self._closed = True
-        self._update = True
+        self._events.close()
+        self._mark()
+
+    def partial(self, text):
+        # The unfinished last line, replaced on every redraw.
+        if self._closed or text == self._partial: return
+        self._partial = text
+        self._mark()
+
+    def sample(self, data):
+        # Keeps a series line as a bounded series instead of a text event.
+        # Returns False for anything else, including new names past the cap.
+        if self._closed or data[:7] not in series.TAGS: return False
+        sample = series.parse(data)
+        if sample is None: return False
+        kind, name, t, value, total = sample
+        s = self._series.get((kind, name))
+        if s is None:
+            if len(self._series) >= Window.MAX_SERIES: return False
+            s = self._series[kind, name] = series.Series(kind, name)
+        s.add(t, value, total)
+        self._partial = None
+        self._mark()
+        return True
 
     def update(self, data):
         if self._closed: return
-        self._events.append(Event(data))
-        self._update = True
+        if data.startswith('[[') and self.sample(data): return
+        self._partial = None
+        event = self._events.append(data)
+        if self._index is not None:
+            self._index.add(event.text)
+        if event.type is not None:
+            self._last_typed = len(self._events) - 1
+        self._mark()
@@ -0,0 +1,110 @@
+import os
+import sys
+import hmac
+import signal
+import asyncio
+import argparse
+from shellbot import protocol
+
+# Runs jobs for a bot and streams their output back over one connection:
+#   python -m shellbot.worker --port 7000 --token SECRET
+#   python -m shellbot.worker --unix /run/shellbot.sock
+# Jobs are killed when the bot that started them disconnects.
+
+CHUNK_SIZE = 1 << 16
+
+class Worker:
+    def __init__(self, token=None):
+        self._token = token
+        self.running = 0
+
+    async def _pump(self, writer, id, ps):
+        try:
+            while True:
+                data = await ps.stdout.read(CHUNK_SIZE)
+                if not data: break
+                protocol.output(writer, id, data)
+                await writer.drain()
+            returncode = await ps.wait()
+        finally:
+            self.running -= 1
+        protocol.send(writer, protocol.EXIT, id=id, returncode=returncode)
+        protocol.send(writer, protocol.LOAD, running=self.running)
+        await writer.drain()
+
+    async def _start(self, writer, id, args, procs, pumps):
+        try:
+            ps = await asyncio.create_subprocess_exec(*args,
+                                                      stdin=asyncio.subprocess.DEVNULL,
+                                                      stdout=asyncio.subprocess.PIPE,
+                                                      stderr=asyncio.subprocess.STDOUT,
+                                                      start_new_session=True)
+        except Exception as e:
+            protocol.send(writer, protocol.ERROR, id=id, error=str(e))
+            return
+        procs[id] = ps
+        self.running += 1
+        protocol.send(writer, protocol.STARTED, id=id, pid=ps.pid)
+        protocol.send(writer, protocol.LOAD, running=self.running)
+        pumps.append(asyncio.create_task(self._pump(writer, id, ps)))
+
+    async def handle(self, reader, writer):
+        procs = {}
+        pumps = []
+        try:
+            kind, payload = await protocol.read(reader)
+            hello = protocol.load(payload) if kind == protocol.HELLO else {}
+            if self._token is not None and not hmac.compare_digest(str(hello.get('token')), self._token):
+                return
+            protocol.send(writer, protocol.HELLO, cpus=os.cpu_count() or 1, running=self.running)
+
+            while True:
+                kind, payload = await protocol.read(reader)
+                message = protocol.load(payload)
+                if kind == protocol.RUN:
+                    await self._start(writer, message['id'], message['args'], procs, pumps)
+                elif kind == protocol.SIGNAL:
+                    ps = procs.get(message['id'])
+                    if ps is not None and ps.returncode is None:
+                        try:
+                            ps.send_signal(getattr(signal, message['signal']))
+                        except ProcessLookupError:
+                            pass
+        except (asyncio.IncompleteReadError, ConnectionError, protocol.ProtocolError):
+            pass
+        finally:
+            for ps in procs.values():
+                if ps.returncode is None:
+                    try:
+                        os.killpg(ps.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+            for pump in pumps:
+                pump.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+            writer.close()
+
+async def serve(host='127.0.0.1', port=7000, unix=None, token=None):
+    worker = Worker(token)
+    if unix is not None:
+        server = await asyncio.start_unix_server(worker.handle, unix)
+    else:
+        server = await asyncio.start_server(worker.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m shellbot.worker',
+                                     description="Runs shellbot jobs on this host.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7000)
+    parser.add_argument('--unix', help="listen on a Unix socket instead")
+    parser.add_argument('--token', default=os.environ.get('SHELLBOT_WORKER_TOKEN'),
+                        help="shared secret the bot must present (default $SHELLBOT_WORKER_TOKEN)")
+    args = parser.parse_args(argv[1:])
+    if args.unix is None and args.token is None and args.host not in ['127.0.0.1', 'localhost', '::1']:
+        parser.error("a --token is required to listen on a non-loopback address")
+    asyncio.run(serve(args.host, args.port, args.unix, args.token))
+
+if __name__ == '__main__':
+    main(sys.argv)